@@ -1,7 +1,81 @@
-from argparse import ArgumentParser, _SubParsersAction
+from argparse import ArgumentParser, ArgumentTypeError, _SubParsersAction
 from sys import argv, exit
 
 
+# actions of stash command
+STASH_ACTIONS = ('push', 'list', 'show', 'apply', 'pop', 'drop', 'clear')
+# each command: usage, help, command hash files (have option jobs),
+#               list of arguments and options of command
+COMMANDS = {
+    'init': ('usage: ./lgit.py init [<directory>]',
+             'Create an empty Git repository or reinitialize an existing one',
+             False,
+             [(('dest',), dict(metavar='directory', nargs='?',
+                               help="Destination to create directories's "
+                               "lgit"))]),
+    'add': ('./lgit.py add <file> ...', 'Add file contents to the index',
+            True,
+            [(('file',), dict(nargs='*',
+                              help="file will be added to the index"))]),
+    'status': ('./lgit status', 'Show the working tree status', True, []),
+    'commit': ('./lgit.py commit -m <message>',
+               'Record changes to the repository', False,
+               [(('-m',), dict(dest='message', help='commit message'))]),
+    'rm': ('./lgit.py rm <file > ...',
+           'Remove files from the working tree and from the index', False,
+           [(('file',), dict(nargs='*', help="file will be removed"))]),
+    'config': ('./lgit.py config [--author <name>] [--chunks on|off]',
+               'Setting config lgit', False,
+               [(('--author',), dict(help='store information author')),
+                (('--chunks',), dict(choices=('on', 'off'),
+                                     help='store large files by content '
+                                     'defined chunks (default off)'))]),
+    'ls-files': ('./lgit.py ls-files',
+                 'Show index file at current directory or subdirectory',
+                 False, []),
+    'log': ('./lgit.py log', 'Show commit logs', False, []),
+    'branch': ('./lgit.py branch [<name>]', 'List or create branches', False,
+               [(('name',), dict(nargs='?', help="create a new branch"))]),
+    'checkout': ('./lgit.py checkout <branch>',
+                 'Switch branches or restore working tree files', True,
+                 [(('branch',), dict(nargs='?',
+                                     help="switched to branch"))]),
+    'merge': ('./lgit.py merge <branch>',
+              'Join two or more development histories together', True,
+              [(('branch',), dict(nargs='?',
+                                  help="join branch into current branch"))]),
+    'stash': ('./lgit.py stash [list | show | apply | pop | drop | clear] '
+              '[<stash>]',
+              'Save the current changes of current working directory', True,
+              [(('action',), dict(nargs='?', choices=STASH_ACTIONS,
+                                  help='push (default) save changes, list '
+                                  'stashes, show files of stash, apply or '
+                                  'pop stash into working directory, drop '
+                                  'or clear stashes')),
+               (('stash',), dict(nargs='?',
+                                 help='stash@{<n>} or <n>, default is '
+                                 'last stash'))]),
+    'gc': ('./lgit.py gc [--prune <days>]',
+           'Remove unused objects and pack objects to reduce disk space',
+           False,
+           [(('--prune',), dict(type=float, metavar='days',
+                                help='remove unused objects older than '
+                                'days (default 14, 0 remove all of '
+                                'them)'))]),
+    'diff': ('./lgit.py diff [--cached] [<commit> [<commit>]]',
+             'Show changes between commits, commit and working tree, etc',
+             True,
+             [(('--cached',), dict(action='store_true',
+                                   help='show changes staged for the '
+                                   'next commit')),
+              (('commit',), dict(nargs='*',
+                                 help='commit or branch to compare'))]),
+    'daemon': ('./lgit.py daemon',
+               'Serve commands of repository from one process by unix '
+               'socket', False, []),
+}
+
+
 def handle_arguments():
     if len(argv) > 1 and is_invalid_command():
         print("lgit: '%s' is not a lgit command. See './lgit.py --help'." %
@@ -16,70 +90,13 @@ def handle_arguments():
                                          description='Git commands used',
                                          prog='lgit',
                                          dest='command', metavar="command")
-        init = commands.add_parser('init',
-                                   usage='usage: ./lgit.py init [<directory>]',
-                                   help='Create an empty Git repository'
-                                   ' or reinitialize an existing one')
-        init.add_argument('dest', metavar='directory', nargs='?',
-                          help="Destination to create directories's lgit")
-
-        add = commands.add_parser('add',
-                                  usage='./lgit.py add <file> ...',
-                                  help='Add file contents to the index')
-        add.add_argument('file', nargs='*',
-                         help="file will be added to the index")
-
-        commands.add_parser('status', usage='./lgit status',
-                            help='Show the working tree status')
-
-        commit = commands.add_parser('commit',
-                                     usage='./lgit.py commit -m <message>',
-                                     help='Record changes to the repository')
-        commit.add_argument('-m', dest='message', help='commit message')
-
-        remove = commands.add_parser('rm',
-                                     usage='./lgit.py rm <file > ...',
-                                     help='Remove files from the '
-                                     'working tree and from the index')
-        remove.add_argument('file', nargs='*',
-                            help="file will be removed")
-
-        config = commands.add_parser('config',
-                                     usage='./lgit.py config --author <name>',
-                                     help='Setting config lgit')
-
-        config.add_argument('--author', help='store information author')
-
-        commands.add_parser('ls-files', usage='./lgit.py ls-files',
-                            help='Show index file at current directory'
-                            ' or subdirectory')
-
-        commands.add_parser('log', usage='./lgit.py log',
-                            help='Show commit logs')
-        branch = commands.add_parser('branch',
-                                     usage='./lgit.py branch [<name>]',
-                                     help='List or create branches')
-        branch.add_argument('name', nargs='?', help="create a new branch")
-
-        checkout = commands.add_parser('checkout',
-                                       usage='./lgit.py checkout <branch>',
-                                       help='Switch branches or restore '
-                                       'working tree files')
-        checkout.add_argument('branch', nargs='?', help="switched to branch")
-
-        merge = commands.add_parser('merge',
-                                    usage='./lgit.py merge <branch>',
-                                    help='Join two or more development'
-                                    ' histories together')
-        merge.add_argument('branch', nargs='?',
-                           help="join branch into current branch")
-
-        stash = commands.add_parser('stash',
-                                    usage='./lgit.py stash [<apply>]',
-                                    help='Save the current changes of current '
-                                    'working directory')
-        stash.add_argument('apply', nargs='?',
-                           help='Restore working directory')
+        # only build parser of command is used
+        # all of commands are built to show help
+        if len(argv) > 1 and argv[1] in COMMANDS:
+            add_command(commands, argv[1])
+        else:
+            for name in COMMANDS:
+                add_command(commands, name)
         # get arguments from sys.argv
         args = parser.parse_args()
 
@@ -92,6 +109,31 @@ def handle_arguments():
     exit()
 
 
+def get_jobs(value):
+    '''
+    Task: return number of threads from value of option jobs
+          it must be at least 1
+    '''
+    try:
+        jobs = int(value)
+    except ValueError:
+        raise ArgumentTypeError("invalid int value: '%s'" % (value))
+    if jobs < 1:
+        raise ArgumentTypeError('number of jobs must be at least 1')
+    return jobs
+
+
+def add_command(commands, name):
+    usage, help_command, is_hash, arguments = COMMANDS[name]
+    command = commands.add_parser(name, usage=usage, help=help_command)
+    # option number of threads for commands need to hash files
+    if is_hash:
+        command.add_argument('-j', '--jobs', type=get_jobs,
+                             help='number of threads hash files')
+    for names, options in arguments:
+        command.add_argument(*names, **options)
+
+
 def show_help_subcommand(parser, command):
     # retrieve subparsers from parser
     subparsers_actions = [
@@ -99,13 +141,12 @@ def show_help_subcommand(parser, command):
         if isinstance(action, _SubParsersAction)]
     # there will probably only be one subparser_action
     for subparsers_action in subparsers_actions:
-        # get all subparsers and print help
-        for choice, subparser in subparsers_action.choices.items():
-            if choice == command:
-                print(subparser.format_help())
+        # only parser of command is used is built, build other command
+        # when its help is shown
+        if command not in subparsers_action.choices:
+            add_command(subparsers_action, command)
+        print(subparsers_action.choices[command].format_help())
 
 
 def is_invalid_command():
-    return argv[1] not in ('init', 'add', 'status', 'commit', 'rm',
-                           'config', 'ls-files', 'log', 'branch',
-                           'checkout', 'merge', 'stash', 'unstash')
+    return argv[1] not in COMMANDS and argv[1] != 'unstash'
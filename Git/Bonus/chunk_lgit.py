@@ -0,0 +1,66 @@
+from hashlib import sha1
+from utils import read_chunks
+
+# file bigger than threshold is stored as list of chunks
+# when it is set by: ./lgit.py config --chunks on
+CHUNK_THRESHOLD = 4 * 1024 * 1024
+# size of chunk (FastCDC): cut point isn't searched before minimum size,
+# hard mask is used before average size then easy mask until maximum
+MIN_SIZE = 16 * 1024
+AVERAGE_SIZE = 64 * 1024
+MAX_SIZE = 256 * 1024
+# mask use high bits of hash, they depend on last 64 bytes read
+MASK_HARD = ((1 << 18) - 1) << 46
+MASK_EASY = ((1 << 14) - 1) << 50
+MASK_64 = (1 << 64) - 1
+# random number of each byte, it is same on every machine
+GEAR = [int.from_bytes(sha1(bytes([i])).digest()[:8], 'big')
+        for i in range(256)]
+
+
+def find_cut_point(data, start, end):
+    '''
+    Task: return end of chunk begin at start in data (FastCDC)
+        + Gear hash: shift hash left and add random number of byte
+        + Cut after byte have hash with all bits of mask are 0
+        + Hard mask before average size and easy mask after it
+          so size of chunks is close to average size
+    '''
+    if end - start <= MIN_SIZE:
+        return end
+    normal = min(start + AVERAGE_SIZE, end)
+    end = min(start + MAX_SIZE, end)
+    gear = GEAR
+    fp = 0
+    i = start + MIN_SIZE
+    for byte in data[i:normal]:
+        fp = ((fp << 1) + gear[byte]) & MASK_64
+        i = i + 1
+        if not fp & MASK_HARD:
+            return i
+    for byte in data[normal:end]:
+        fp = ((fp << 1) + gear[byte]) & MASK_64
+        i = i + 1
+        if not fp & MASK_EASY:
+            return i
+    return end
+
+
+def iter_chunks(file):
+    '''
+    Task: yield content of file by content defined chunks
+          same data in 2 versions of file is cut into same chunks
+          even when bytes are inserted or deleted before it
+    '''
+    buffer = bytearray()
+    for data in read_chunks(file):
+        buffer += data
+        # keep maximum size in buffer so cut point is same as whole file
+        while len(buffer) >= MAX_SIZE:
+            cut = find_cut_point(buffer, 0, len(buffer))
+            yield bytes(buffer[:cut])
+            del buffer[:cut]
+    while buffer:
+        cut = find_cut_point(buffer, 0, len(buffer))
+        yield bytes(buffer[:cut])
+        del buffer[:cut]
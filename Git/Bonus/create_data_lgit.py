@@ -1,14 +1,20 @@
 import os
+import zlib
 import print_message
 import get_data_lgit as lgit_g
-from utils import write_file, read_file, hash_sha1, split_dir_file
+import graph_lgit
+from utils import write_file_atomic, read_chunks
+from utils import map_files, sync_later, make_temp_file
+from hashlib import sha1
+from pack_lgit import get_path_object, format_list_chunks
+from chunk_lgit import CHUNK_THRESHOLD, iter_chunks
 from sys import exit as exit_program
 
 
 def create_branch(name, commit):
     os.makedirs('.lgit/stash/heads/%s/objects' % (name))
-    write_file(['%s\n' % (commit)],
-               '.lgit/refs/heads/%s' % (name))
+    write_file_atomic(['%s\n' % (commit)],
+                      '.lgit/refs/heads/%s' % (name))
 
 
 def create_commit(message, time_ns):
@@ -16,43 +22,166 @@ def create_commit(message, time_ns):
     author = lgit_g.get_author()
     t_commit = time_ns.split('.')[0]
     p_commit = lgit_g.get_commit_branch()
-    write_file(["%s\n%s\n%s\n\n%s\n" %
-                (author, t_commit, p_commit, message)],
-               '.lgit/commits/%s' % (time_ns))
+    write_file_atomic(["%s\n%s\n%s\n\n%s\n" %
+                       (author, t_commit, p_commit, message)],
+                      '.lgit/commits/%s' % (time_ns))
+    graph_lgit.add_commit(time_ns, p_commit)
 
 
 def create_snapshot(path):
-    # save all of hash commit and path in index file
+    # save tree of all of hash commit and path in index file
     # into timestamp of commit file at snapshot directory
-    data_snap = []
-    for line in read_file('.lgit/index'):
-        _, _, _, h_commit, name = lgit_g.get_info_index(line)
-        data_snap.append(h_commit + " " + name + '\n')
-    write_file(data_snap, file=path)
+    files_hash = {name: h_commit
+                  for _, _, _, h_commit, name in lgit_g.read_index()}
+    write_file_atomic(['tree %s\n' % (create_tree(files_hash))], file=path)
+
+
+def create_tree(files_hash):
+    '''
+    Task: Store tree object of each directory from files and their hash
+        + Tree object have a line for each file or subdirectory
+          with its type, hash and name
+        + Unchanged directory have same hash then it isn't stored again
+    :param files_hash: a dictionary: key is file, value is hash of file
+    :return: hash of tree of top directory
+    '''
+    direcs = {'': {}}
+    for file, hash_f in files_hash.items():
+        head, name = os.path.split(file)
+        direc = head
+        while direc not in direcs:
+            direcs[direc] = {}
+            direc = os.path.dirname(direc)
+        direcs[head][name] = (lgit_g.BLOB, hash_f)
+    # create tree of subdirectories before tree of their parent
+    for direc in sorted(direcs, key=lambda d: d.count('/'), reverse=True):
+        if direc:
+            head, name = os.path.split(direc)
+            direcs[head][name] = (lgit_g.TREE, create_tree_object(
+                direcs[direc]))
+    return create_tree_object(direcs[''])
+
+
+def create_tree_object(entries):
+    data = ''.join(['%s %s %s\n' % (entries[name][0], entries[name][1], name)
+                    for name in sorted(entries)])
+    return create_object_data(data.encode())
+
+
+def create_object_data(data):
+    '''
+    Task: store compressed data in lgit database if it isn't stored before
+    :return: hash of data
+    '''
+    hash_f = sha1(data).hexdigest()
+    if not lgit_g.is_have_object(hash_f):
+        file_obj = get_path_object(hash_f)
+        os.makedirs(os.path.dirname(file_obj), exist_ok=True)
+        write_file_atomic([zlib.compress(data)], file_obj, mode='wb')
+    return hash_f
 
 
 def create_object(files_add):
     '''
     Task:
-        + Store a copy of the file content in the lgit database
+        + Store a compressed copy of the file content in the lgit database
         + Each file will be stocked in the following way:
             - first two characters of the SHA1 will be the directory name
             - last 38 characters will be the file name
+        + Large file is stored by chunks when config chunks is on
+    :return: dictionary key is file, value is hash of file
+    '''
+    files_add = list(files_add)
+    task = _create_object
+    # chunking is slower than one zlib stream, only used when it is set
+    if lgit_g.get_config('chunks') == 'on':
+        task = create_object_large
+    return dict(zip(files_add, map_files(task, files_add)))
+
+
+def create_object_large(path):
+    '''
+    Task: store large file by chunks and other files as one object
+    '''
+    if os.stat(path).st_size >= CHUNK_THRESHOLD:
+        return create_object_chunks(path)
+    return _create_object(path)
+
+
+def _create_object(path):
+    '''
+    Task: hash and compress file in one read into temporary object
+          then rename it into its hash, return hash of file
+    '''
+    hash_f = sha1()
+    compress = zlib.compressobj()
+    fd, path_tmp = make_temp_file('.lgit/objects', 'tmp_obj_')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in read_chunks(path):
+                hash_f.update(chunk)
+                f.write(compress.compress(chunk))
+            f.write(compress.flush())
+        hash_f = hash_f.hexdigest()
+        if lgit_g.is_have_object(hash_f):
+            os.remove(path_tmp)
+        else:
+            file_obj = get_path_object(hash_f)
+            os.makedirs(os.path.dirname(file_obj), exist_ok=True)
+            os.replace(path_tmp, file_obj)
+            sync_later(file_obj)
+    except BaseException:
+        if os.path.exists(path_tmp):
+            os.remove(path_tmp)
+        raise
+    return hash_f
+
+
+def create_object_chunks(path):
+    '''
+    Task: store large file as list of content defined chunks
+        + Each chunk is stored as object if it isn't stored before
+          so versions of file only store chunks are changed
+        + Object of file is list of hash and size of its chunks
+          it is named by hash of content of file like other objects
+    :return: hash of file
     '''
-    for path in files_add:
-        hash_f = hash_sha1(path)
-        direc_obj, file_obj = split_dir_file(hash_f)
-        direc_obj = '.lgit/objects/%s' % (direc_obj)
-        if not os.path.exists(direc_obj):
-            os.makedirs(direc_obj)
-        file_obj = os.path.join(direc_obj, file_obj)
-        if not os.path.exists(file_obj):
-            write_file(read_file(path, mode='rb'), file_obj, mode='wb')
+    hash_f = sha1()
+    chunks = []
+    for chunk in iter_chunks(path):
+        hash_f.update(chunk)
+        hash_c = sha1(chunk).hexdigest()
+        if not lgit_g.is_have_object(hash_c):
+            create_loose_object(hash_c, zlib.compress(chunk))
+        chunks.append((hash_c, len(chunk)))
+    hash_f = hash_f.hexdigest()
+    if not lgit_g.is_have_object(hash_f):
+        create_loose_object(hash_f, format_list_chunks(chunks))
+    return hash_f
+
+
+def create_loose_object(hash_f, data):
+    '''
+    Task: write data of object into unique temporary file then rename it
+          into its hash, so threads add same chunk at same time safely
+    '''
+    fd, path_tmp = make_temp_file('.lgit/objects', 'tmp_obj_')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        file_obj = get_path_object(hash_f)
+        os.makedirs(os.path.dirname(file_obj), exist_ok=True)
+        os.replace(path_tmp, file_obj)
+        sync_later(file_obj)
+    except BaseException:
+        if os.path.exists(path_tmp):
+            os.remove(path_tmp)
+        raise
 
 
 def create_info_branch(branch):
-    write_file(['%s\n' % (lgit_g.get_commit_branch())],
-               '.lgit/info/%s' % (branch))
+    write_file_atomic(['%s\n' % (lgit_g.get_commit_branch())],
+                      '.lgit/info/%s' % (branch))
 
 
 def create_structure_lgit(direcs, files):
@@ -75,12 +204,28 @@ def create_structure_lgit(direcs, files):
 
 
 def create_stash(modified_file, time_ns):
+    '''
+    Task: save record of stash points to objects of modified files
+        + Hash current in index is hash of file now because status
+          is updated before, file is only read again to store
+          its object when object isn't stored before
+        + Record have commit and branch at time stash then hash
+          and path of each file
+    '''
     if _is_valid_stash(modified_file):
-        create_object(modified_file)
-        data_stash = []
+        files_hash = {}
+        hash_index = lgit_g.get_hash_index()
+        for file in modified_file:
+            if lgit_g.is_have_object(hash_index[file][0]):
+                files_hash[file] = hash_index[file][0]
+        files_hash.update(create_object(
+            [f for f in modified_file if f not in files_hash]))
+        # commit of branch is origin of files when stash is applied
+        data_stash = ['commit %s\n' % (lgit_g.get_commit_branch()),
+                      'branch %s\n' % (lgit_g.get_branch_now())]
         for file in modified_file:
-            data_stash.append("%s %s\n" % (hash_sha1(file), file))
-        write_file(data_stash, '.lgit/refs/stash/%s' % (time_ns))
+            data_stash.append("%s %s\n" % (files_hash[file], file))
+        write_file_atomic(data_stash, '.lgit/refs/stash/%s' % (time_ns))
 
 
 def _is_valid_stash(files):
@@ -0,0 +1,138 @@
+import os
+from utils import lazy_import
+
+# only loaded when daemon is running
+json = lazy_import('json')
+socket = lazy_import('socket')
+signal = lazy_import('signal')
+
+# unix socket of daemon in lgit directory of repository
+SOCKET_FILE = '.lgit/daemon.sock'
+
+
+def find_socket():
+    '''
+    Task: return path of socket of daemon of repository have current
+          directory inside it, None if there is no daemon
+    '''
+    direc = os.getcwd()
+    while True:
+        path = os.path.join(direc, SOCKET_FILE)
+        if os.path.exists(path):
+            return path
+        if os.path.isdir(os.path.join(direc, '.lgit')):
+            return None
+        parent = os.path.dirname(direc)
+        if parent == direc:
+            return None
+        direc = parent
+
+
+def send_command(args):
+    '''
+    Task: send command to daemon of repository and print its output
+    :return: False if there is no daemon then command need to run here
+    '''
+    path = find_socket()
+    if path is None:
+        return False
+    request = {'cwd': os.getcwd(), 'args': args}
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(path)
+            client.sendall(json.dumps(request).encode() + b'\n')
+            client.shutdown(socket.SHUT_WR)
+            response = read_all(client)
+    except OSError:
+        return False
+    print(json.loads(response.decode())['output'], end='')
+    return True
+
+
+def is_serving(path):
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(path)
+        return True
+    except OSError:
+        return False
+
+
+def read_all(connection):
+    chunks = []
+    chunk = connection.recv(65536)
+    while chunk:
+        chunks.append(chunk)
+        chunk = connection.recv(65536)
+    return b''.join(chunks)
+
+
+def is_inside(root, direc):
+    '''
+    Task: return True if directory is root or inside it
+          after symlinks of both of them are resolved
+    '''
+    root = os.path.realpath(root)
+    direc = os.path.realpath(str(direc))
+    return os.path.commonpath([root, direc]) == root
+
+
+def serve():
+    '''
+    Task: run commands sent by lgit of repository one by one
+          in this process until it is stopped (Ctrl-C or kill)
+        + Index, refs, commit graph are kept in memory between commands
+        + Socket is removed when daemon stop
+    '''
+    from repository_lgit import Repository
+    repo = Repository('.')
+    path = os.path.join(repo.root, SOCKET_FILE)
+    if os.path.exists(path):
+        if is_serving(path):
+            print('fatal: daemon of repository is running')
+            return
+        # socket left by daemon killed before
+        os.remove(path)
+    # stop daemon by Ctrl-C or kill, both of them remove socket
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        # only owner of daemon can connect to it (mode 600), socket is
+        # created with this mode so there is no time it is open to all
+        old_umask = os.umask(0o177)
+        try:
+            server.bind(path)
+        finally:
+            os.umask(old_umask)
+        server.listen()
+        print('Serving lgit repository at %s' % (repo.root), flush=True)
+        try:
+            while True:
+                connection, _ = server.accept()
+                with connection:
+                    handle_request(repo, connection)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def handle_request(repo, connection):
+    '''
+    Task: run command of request and send its output back
+        + Directory of request must be inside repository
+        + Error of one command is sent as output, daemon keep running
+    '''
+    try:
+        request = json.loads(read_all(connection).decode())
+        if not is_inside(repo.root, request['cwd']):
+            raise ValueError('%s is outside repository %s' %
+                             (request['cwd'], repo.root))
+        output = repo.run(*request['args'], cwd=request['cwd'])
+    except Exception as error:
+        output = 'fatal: %s\n' % (error)
+    try:
+        connection.sendall(json.dumps({'output': output}).encode())
+    except OSError:
+        pass
@@ -0,0 +1,288 @@
+from array import array
+
+
+def intern_lines(lines, ids, table):
+    '''
+    Task: return array of id of each line, same lines have same id
+          so diff only compare integers instead of strings
+    :param lines: iterable of lines, it is read only one time
+    :param ids: dictionary line is key, id is value, shared between files
+    :param table: list line of each id, shared between files
+    '''
+    result = array('i')
+    for line in lines:
+        id_line = ids.get(line)
+        if id_line is None:
+            id_line = ids[line] = len(table)
+            table.append(line)
+        result.append(id_line)
+    return result
+
+
+def get_matching_blocks(a, b):
+    '''
+    Task: return list of matching blocks (i, j, size) of 2 sequences
+          a[i:i + size] == b[j:j + size], sorted by i and j
+          last block is (len(a), len(b), 0) like difflib
+        + Remove common prefix and suffix of each part first
+        + Split part at middle snake of Myers diff in linear space
+          then diff 2 parts left until they haven't difference
+    '''
+    blocks = []
+    parts = [(0, len(a), 0, len(b))]
+    while parts:
+        a_lo, a_hi, b_lo, b_hi = parts.pop()
+        # common prefix
+        size = 0
+        while (a_lo + size < a_hi and b_lo + size < b_hi and
+               a[a_lo + size] == b[b_lo + size]):
+            size = size + 1
+        if size:
+            blocks.append((a_lo, b_lo, size))
+            a_lo, b_lo = a_lo + size, b_lo + size
+        # common suffix
+        size = 0
+        while (a_lo < a_hi - size and b_lo < b_hi - size and
+               a[a_hi - size - 1] == b[b_hi - size - 1]):
+            size = size + 1
+        if size:
+            a_hi, b_hi = a_hi - size, b_hi - size
+            blocks.append((a_hi, b_hi, size))
+        if a_lo == a_hi or b_lo == b_hi:
+            continue
+        x_start, y_start, x_end, y_end = find_middle_snake(
+            a, a_lo, a_hi, b, b_lo, b_hi)
+        if x_end > x_start:
+            blocks.append((a_lo + x_start, b_lo + y_start, x_end - x_start))
+        parts.append((a_lo + x_end, a_hi, b_lo + y_end, b_hi))
+        parts.append((a_lo, a_lo + x_start, b_lo, b_lo + y_start))
+    return join_blocks(sorted(blocks), len(a), len(b))
+
+
+def join_blocks(blocks, len_a, len_b):
+    '''
+    Task: join blocks next to each other into one block
+    '''
+    result = []
+    for i, j, size in blocks:
+        if result and result[-1][0] + result[-1][2] == i and \
+                result[-1][1] + result[-1][2] == j:
+            result[-1] = (result[-1][0], result[-1][1], result[-1][2] + size)
+        else:
+            result.append((i, j, size))
+    result.append((len_a, len_b, 0))
+    return result
+
+
+def find_middle_snake(a, a_lo, a_hi, b, b_lo, b_hi):
+    '''
+    Task: return start and end of middle snake of shortest edit script
+          between a[a_lo:a_hi] and b[b_lo:b_hi], relative with a_lo, b_lo
+        + Search forward from start and backward from end at same time
+          until 2 paths overlap at diagonal k
+        + v_forward[k] is furthest x of forward path on diagonal k
+          v_backward[k] is furthest x of backward path on diagonal k
+          counted from end of 2 sequences
+    '''
+    n, m = a_hi - a_lo, b_hi - b_lo
+    delta = n - m
+    odd = delta % 2
+    offset = (n + m + 1) // 2 + 1
+    v_forward = [0] * (2 * offset + 1)
+    v_backward = [0] * (2 * offset + 1)
+    for d in range((n + m + 1) // 2 + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v_forward[offset + k - 1] <
+                           v_forward[offset + k + 1]):
+                x = v_forward[offset + k + 1]
+            else:
+                x = v_forward[offset + k - 1] + 1
+            y = x - k
+            x_start, y_start = x, y
+            while x < n and y < m and a[a_lo + x] == b[b_lo + y]:
+                x, y = x + 1, y + 1
+            v_forward[offset + k] = x
+            if odd and -(d - 1) <= delta - k <= d - 1 and \
+                    x + v_backward[offset + delta - k] >= n:
+                return x_start, y_start, x, y
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v_backward[offset + k - 1] <
+                           v_backward[offset + k + 1]):
+                x = v_backward[offset + k + 1]
+            else:
+                x = v_backward[offset + k - 1] + 1
+            y = x - k
+            x_start, y_start = x, y
+            while x < n and y < m and \
+                    a[a_hi - 1 - x] == b[b_hi - 1 - y]:
+                x, y = x + 1, y + 1
+            v_backward[offset + k] = x
+            if not odd and -d <= delta - k <= d and \
+                    x + v_forward[offset + delta - k] >= n:
+                return n - x, m - y, n - x_start, m - y_start
+    # 2 paths always overlap before d is bigger than half of n + m
+    raise ValueError('middle snake not found')
+
+
+def find_sync_regions(origin, master, branch):
+    '''
+    Task: return list of regions are same in 3 sequences
+          each region is start and end in origin, master, branch
+          last region is empty region at end of 3 sequences
+    '''
+    blocks_m = get_matching_blocks(origin, master)
+    blocks_b = get_matching_blocks(origin, branch)
+    regions = []
+    i_mas = i_bra = 0
+    while i_mas < len(blocks_m) and i_bra < len(blocks_b):
+        ori_m, mas, size_m = blocks_m[i_mas]
+        ori_b, bra, size_b = blocks_b[i_bra]
+        # intersect of 2 blocks in origin
+        start = max(ori_m, ori_b)
+        end = min(ori_m + size_m, ori_b + size_b)
+        if start < end:
+            start_m = mas + start - ori_m
+            start_b = bra + start - ori_b
+            regions.append((start, end, start_m, start_m + end - start,
+                            start_b, start_b + end - start))
+        if ori_m + size_m < ori_b + size_b:
+            i_mas = i_mas + 1
+        else:
+            i_bra = i_bra + 1
+    regions.append((len(origin), len(origin), len(master), len(master),
+                    len(branch), len(branch)))
+    return regions
+
+
+def merge3(origin, master, branch):
+    '''
+    Task: merge 2 files changed from same origin (diff3)
+          return list of (tag, master, branch), tag is one of
+        + 'equal': lines are same in 3 files
+        + 'changes': lines only changed at one side or same at 2 sides
+        + 'conflict': lines changed different at 2 sides
+    :param origin, master, branch: iterable of lines of each file
+    '''
+    ids, table = {}, []
+    origin = intern_lines(origin, ids, table)
+    master = intern_lines(master, ids, table)
+    branch = intern_lines(branch, ids, table)
+    return [(tag, [table[i] for i in lines_m], [table[i] for i in lines_b])
+            for tag, lines_m, lines_b in merge3_ids(origin, master, branch)]
+
+
+def merge3_ids(origin, master, branch):
+    '''
+    Task: diff3 of 3 arrays of line id, return same format with merge3
+          but lines are array of id
+    '''
+    empty = array('i')
+    merge_file = []
+    i_ori = i_mas = i_bra = 0
+    for start_o, end_o, start_m, end_m, start_b, end_b in \
+            find_sync_regions(origin, master, branch):
+        part_o = origin[i_ori:start_o]
+        part_m = master[i_mas:start_m]
+        part_b = branch[i_bra:start_b]
+        if part_m or part_b:
+            if part_m == part_b or part_b == part_o:
+                merge_file.append(('changes', part_m, empty))
+            elif part_m == part_o:
+                merge_file.append(('changes', part_b, empty))
+            else:
+                merge_file.append(('conflict', part_m, part_b))
+        if end_o > start_o:
+            merge_file.append(('equal', origin[start_o:end_o], empty))
+        i_ori, i_mas, i_bra = end_o, end_m, end_b
+    return merge_file
+
+
+def get_opcodes(blocks):
+    '''
+    Task: return list of (tag, i1, i2, j1, j2) from matching blocks
+          tag is 'equal', 'replace', 'delete', 'insert' like difflib
+    '''
+    opcodes = []
+    i = j = 0
+    for i_block, j_block, size in blocks:
+        if i < i_block and j < j_block:
+            opcodes.append(('replace', i, i_block, j, j_block))
+        elif i < i_block:
+            opcodes.append(('delete', i, i_block, j, j_block))
+        elif j < j_block:
+            opcodes.append(('insert', i, i_block, j, j_block))
+        if size:
+            opcodes.append(('equal', i_block, i_block + size,
+                            j_block, j_block + size))
+        i, j = i_block + size, j_block + size
+    return opcodes
+
+
+def group_opcodes(opcodes, context=3):
+    '''
+    Task: yield groups of opcodes for each hunk of unified diff
+          each group have changes with context lines around them
+    '''
+    if not opcodes or (len(opcodes) == 1 and opcodes[0][0] == 'equal'):
+        return
+    opcodes = list(opcodes)
+    tag, i1, i2, j1, j2 = opcodes[0]
+    if tag == 'equal':
+        opcodes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    tag, i1, i2, j1, j2 = opcodes[-1]
+    if tag == 'equal':
+        opcodes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+    group = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        # long equal lines split 2 hunks
+        if tag == 'equal' and i2 - i1 > 2 * context:
+            group.append((tag, i1, i1 + context, j1, j1 + context))
+            yield group
+            group = []
+            i1, j1 = i2 - context, j2 - context
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+
+def format_range(start, stop):
+    length = stop - start
+    if length == 1:
+        return '%d' % (start + 1)
+    if not length:
+        return '%d,0' % (start)
+    return '%d,%d' % (start + 1, length)
+
+
+def format_line(mark, line):
+    if line.endswith('\n'):
+        return mark + line
+    return '%s%s\n\\ No newline at end of file\n' % (mark, line)
+
+
+def unified_diff(old, new, name_old, name_new, context=3):
+    '''
+    Task: yield lines of unified diff between 2 files
+    :param old, new: iterable of lines of each file
+    '''
+    ids, table = {}, []
+    old = intern_lines(old, ids, table)
+    new = intern_lines(new, ids, table)
+    opcodes = get_opcodes(get_matching_blocks(old, new))
+    started = False
+    for group in group_opcodes(opcodes, context):
+        if not started:
+            yield '--- %s\n' % (name_old)
+            yield '+++ %s\n' % (name_new)
+            started = True
+        yield '@@ -%s +%s @@\n' % (format_range(group[0][1], group[-1][2]),
+                                   format_range(group[0][3], group[-1][4]))
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for id_line in old[i1:i2]:
+                    yield format_line(' ', table[id_line])
+                continue
+            for id_line in old[i1:i2]:
+                yield format_line('-', table[id_line])
+            for id_line in new[j1:j2]:
+                yield format_line('+', table[id_line])
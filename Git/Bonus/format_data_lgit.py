@@ -22,9 +22,11 @@ def format_time(timestamp, second=True):
     return timestamp.strftime('%Y%m%d%H%M%S.%f')
 
 
-# get string format index
-def format_index(timestamp, current, add, commit, path):
-    return '%s %s %s %40s %s\n' % (timestamp, current, add, commit, path)
+# get string format index, stat is mtime_ns, ctime_ns, size, inode
+def format_index(timestamp, current, add, commit, path, stat):
+    return '%s %s %s %40s %s %s\n' % (
+        timestamp, current, add, commit,
+        ''.join('%016x' % (value) for value in stat), path)
 
 
 def format_conflict(data_rec, data_mer, branch_m):
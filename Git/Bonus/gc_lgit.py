@@ -0,0 +1,92 @@
+import os
+from time import time
+import pack_lgit
+import get_data_lgit as lgit_g
+
+# unused object is only removed when it is older than grace period
+# so object written by command is running isn't removed
+GRACE_PERIOD = 14 * 24 * 3600
+
+
+def mark_objects():
+    '''
+    Task: return bloom filter of objects are used by snapshots,
+          stashes and index (mark phase)
+    '''
+    marked = pack_lgit.BloomFilter(pack_lgit.count_objects())
+    for hash_f in lgit_g.iter_used_objects():
+        marked.add(bytes.fromhex(hash_f))
+    return marked
+
+
+def sweep_loose_objects(marked, expire):
+    '''
+    Task: remove loose objects aren't marked and older than expire time
+          one directory of objects is read at a time
+    :return: number of objects and bytes are removed,
+             set hash of objects aren't marked but are kept
+    '''
+    number = size = 0
+    kept = set()
+    for direc in pack_lgit.iter_object_direcs():
+        with os.scandir(direc.path) as entries:
+            for entry in entries:
+                try:
+                    hash_b = bytes.fromhex(direc.name + entry.name)
+                except ValueError:
+                    # lock file left by crashed process
+                    continue
+                if hash_b in marked:
+                    continue
+                info = entry.stat()
+                if info.st_mtime >= expire:
+                    kept.add(hash_b)
+                    continue
+                os.remove(entry.path)
+                number, size = number + 1, size + info.st_size
+        if not os.listdir(direc.path):
+            os.rmdir(direc.path)
+    return number, size, kept
+
+
+def sweep_packed_objects(marked, expire, kept):
+    '''
+    Task: find objects in packs aren't marked
+        + Pack is older than expire time: object is removed with pack
+        + Else object is written as loose object have time of pack
+          so it isn't packed again and expire at same time
+    :return: set hash of objects are removed, number of bytes of them
+    '''
+    removed = set()
+    size = 0
+    for pack in pack_lgit.get_packs():
+        path = '%s/%s.pack' % (pack_lgit.PACK_DIREC, pack)
+        is_old = os.path.getmtime(path) < expire
+        for hash_b, offset, length in pack_lgit.get_packed_objects(pack):
+            if hash_b in marked or hash_b in kept:
+                continue
+            if is_old:
+                removed.add(hash_b)
+                size = size + length
+            else:
+                pack_lgit.unpack_object(hash_b, (pack, offset, length))
+                kept.add(hash_b)
+    return removed, size
+
+
+def collect_garbage(grace=GRACE_PERIOD):
+    '''
+    Task: mark used objects then remove unused objects older than
+          grace period, pack all of used objects into one pack
+          unused objects in grace period stay as loose objects
+    :param grace: seconds unused object is kept after it is written
+    :return: number of objects and bytes are removed,
+             number of objects are packed
+    '''
+    expire = time() - grace
+    marked = mark_objects()
+    number, size, kept = sweep_loose_objects(marked, expire)
+    removed, size_packed = sweep_packed_objects(marked, expire, kept)
+    packed = pack_lgit.repack(lgit_g.get_history_objects(),
+                              unused=removed | kept)
+    return number + len(removed), size + size_packed, packed
@@ -1,5 +1,23 @@
-from utils import read_file, split_dir_file, get_files_direc, hash_sha1
+from utils import read_file, get_files_direc, hash_sha1, map_files
+from utils import lazy_import
+from io import BytesIO, TextIOWrapper
+from itertools import chain
 import os
+import re
+
+# objects are only read from packs when loose object isn't found
+pack_lgit = lazy_import('pack_lgit')
+
+# type of entry in tree object
+BLOB = 'blob'
+TREE = 'tree'
+# stat cache of file in index: mtime_ns, ctime_ns, size, inode
+# all of zero mean unknown stat then file always need to be rehashed
+STAT_EMPTY = (0, 0, 0, 0)
+STAT_PATTERN = re.compile('[0-9a-f]{64} ')
+# lines of index file and their fields, index is parsed one time
+# in a command while its lines are the same
+_index = [None, []]
 
 
 def get_all_branchs():
@@ -10,29 +28,194 @@ def get_modified_branch():
     branch_commit = get_commit_branch()
     files_hash = get_files_hash(branch_commit)
     modified_file = []
-    for file in files_hash.keys():
-        if hash_sha1(file) != files_hash[file]:
+    files = list(files_hash.keys())
+    for file, hash_f in zip(files, map_files(hash_sha1, files)):
+        if hash_f != files_hash[file]:
             modified_file.append(file)
     return modified_file
 
 
 def get_files_hash(commit, mode='commit'):
     if mode == 'commit':
+        tree = get_root_tree(commit)
+        if tree is not None:
+            return get_tree_files(tree)
         info_cmit = read_file('.lgit/snapshots/%s' % (commit))
     elif mode == 'stash':
         info_cmit = read_file('.lgit/refs/stash/%s' % (commit))
     files_hash = {}
     for line in info_cmit:
+        # header lines of stash record
+        if line.startswith(('commit ', 'branch ')):
+            continue
         hash_f, file = get_info_snap(line)
         files_hash[file] = hash_f
     return files_hash
 
 
+def get_stash_commit(stash):
+    '''
+    Task: return commit of branch at time stash, '' if there is no commit
+          None if stash is old format without commit
+    '''
+    lines = read_file('.lgit/refs/stash/%s' % (stash))
+    if lines and lines[0].startswith('commit '):
+        return lines[0][7:].strip()
+    return None
+
+
+def get_stash_branch(stash):
+    '''
+    Task: return branch at time stash, '' if stash is old format
+    '''
+    for line in read_file('.lgit/refs/stash/%s' % (stash))[:2]:
+        if line.startswith('branch '):
+            return line[7:].strip()
+    return ''
+
+
+def get_stashes():
+    '''
+    Task: return list name of stash records from newest to oldest
+          position in list is number n of stash@{n}
+    '''
+    if not os.path.isdir('.lgit/refs/stash'):
+        return []
+    return sorted((f for f in os.listdir('.lgit/refs/stash')
+                   if not f.endswith('.lock')), reverse=True)
+
+
+def iter_used_objects():
+    '''
+    Task: yield hash of objects are used by snapshots of commits,
+          stashes and index, chunks of object stored by chunks are
+          yielded after it, hash can be yielded many times
+          so used objects aren't kept in memory
+    '''
+    snapshots = (hash_f for _, hash_f in get_history_objects())
+    stashes = (hash_f for stash in get_stashes()
+               for hash_f in get_files_hash(stash, mode='stash').values())
+    index = (hash_f for hashes in get_hash_index().values()
+             for hash_f in hashes)
+    for hash_f in chain(snapshots, stashes, index):
+        if hash_f:
+            yield hash_f
+            yield from pack_lgit.get_chunks(hash_f)
+
+
+def get_root_tree(commit):
+    '''
+    Task: return hash of top tree of commit, '' if there is no commit
+          None if snapshot of commit is old format without tree
+    '''
+    if not commit:
+        return ''
+    lines = read_file('.lgit/snapshots/%s' % (commit))
+    if lines and lines[0].startswith('tree '):
+        return lines[0][5:].strip()
+    return None
+
+
+def read_tree(hash_tree):
+    '''
+    Task: return dictionary name of entry is key, type and hash is value
+    '''
+    entries = {}
+    if hash_tree:
+        for line in get_data_object(hash_tree).decode().splitlines():
+            type_e, hash_e, name = line.split(' ', 2)
+            entries[name] = (type_e, hash_e)
+    return entries
+
+
+def get_tree_files(hash_tree):
+    '''
+    Task: return dictionary path of file is key, hash of file is value
+          of all files in tree and its subtrees
+    '''
+    files_hash = {}
+    trees = [('', hash_tree)]
+    while trees:
+        direc, hash_tree = trees.pop()
+        for name, (type_e, hash_e) in read_tree(hash_tree).items():
+            if type_e == TREE:
+                trees.append((direc + name + '/', hash_e))
+            else:
+                files_hash[direc + name] = hash_e
+    return files_hash
+
+
+def diff_trees(tree_old, tree_new):
+    '''
+    Task: yield path, type, old hash, new hash of entries are different
+          between 2 trees, '' hash mean entry isn't in tree
+        + Subtrees have same hash are skipped without reading them
+    '''
+    trees = [('', tree_old, tree_new)]
+    while trees:
+        direc, tree_old, tree_new = trees.pop()
+        entries_old = read_tree(tree_old)
+        entries_new = read_tree(tree_new)
+        for name in sorted(set(entries_old) | set(entries_new)):
+            type_old, hash_old = entries_old.get(name, ('', ''))
+            type_new, hash_new = entries_new.get(name, ('', ''))
+            if hash_old == hash_new and type_old == type_new:
+                continue
+            path = direc + name
+            if type_old == type_new:
+                yield path, type_old, hash_old, hash_new
+            else:
+                if type_old:
+                    yield path, type_old, hash_old, ''
+                if type_new:
+                    yield path, type_new, '', hash_new
+            sub_old = hash_old if type_old == TREE else ''
+            sub_new = hash_new if type_new == TREE else ''
+            if sub_old or sub_new:
+                trees.append((path + '/', sub_old, sub_new))
+
+
+def diff_commits(commit_old, commit_new):
+    '''
+    Task: return dictionary path of file is key, old hash and new hash
+          is value of files are different between 2 commits
+    '''
+    tree_old = get_root_tree(commit_old)
+    tree_new = get_root_tree(commit_new)
+    if tree_old is not None and tree_new is not None:
+        return {path: (hash_old, hash_new) for path, type_e, hash_old,
+                hash_new in diff_trees(tree_old, tree_new)
+                if type_e == BLOB}
+    # snapshot of old format then compare all of files
+    files_old = get_files_hash(commit_old) if commit_old else {}
+    files_new = get_files_hash(commit_new) if commit_new else {}
+    return {path: (files_old.get(path, ''), files_new.get(path, ''))
+            for path in set(files_old) | set(files_new)
+            if files_old.get(path) != files_new.get(path)}
+
+
+def get_history_objects():
+    '''
+    Task: yield path and hash of each new version of files and trees
+          from oldest snapshot to newest snapshot
+    '''
+    tree_last = ''
+    for commit in sorted(os.listdir('.lgit/snapshots')):
+        tree = get_root_tree(commit)
+        if tree is None:
+            yield from get_files_hash(commit).items()
+            continue
+        yield '', tree
+        for path, _, _, hash_new in diff_trees(tree_last, tree):
+            if hash_new:
+                yield path, hash_new
+        tree_last = tree
+
+
 def get_staged_unstaged():
     staged_file = []
     unstaged_file = []
-    for line in read_file(file='.lgit/index'):
-        _, h_current, h_add, h_commit, name = get_info_index(line)
+    for _, h_current, h_add, h_commit, name in read_index():
         if h_current != h_add or not os.access(name, os.R_OK):
             unstaged_file.append(name)
         if h_add != h_commit:
@@ -44,37 +227,108 @@ def get_tracked_unstracked():
     '''
     Task: Return list tracked and untracked file in index file
     '''
-    tracked = []
-    for line in read_file('.lgit/index'):
-        _, _, _, _, file = get_info_index(line)
-        tracked.append(file)
-    untracked = [file for file in get_files_direc() if file not in tracked]
+    tracked = get_tracked_files()
+    tracked_set = set(tracked)
+    untracked = [file for file in get_files_direc()
+                 if file not in tracked_set]
     return tracked, untracked
 
 
+def get_tracked_files():
+    return [file for _, _, _, _, file in read_index()]
+
+
+def get_hash_index():
+    '''
+    Task: return dictionary path of tracked file is key,
+          hash current, hash add, hash commit is value
+    '''
+    return {file: (h_current, h_add, h_commit.strip())
+            for _, h_current, h_add, h_commit, file in read_index()}
+
+
 def get_pos_track(files):
     '''
     Task: return dictionary with key is file, value is location in index file
     '''
-    locations = {}
-    for index, line in enumerate(read_file('.lgit/index')):
-        _, _, _, _, path = get_info_index(line)
-        if path in files:
-            locations[path] = index
-    return locations
+    files = set(files)
+    return {path: index
+            for index, (_, _, _, _, path) in enumerate(read_index())
+            if path in files}
+
+
+def read_index():
+    '''
+    Task: return list of fields of each line in index file
+          (timestamp, hash current, hash add, hash commit, path)
+        + Lines are parsed again only when index file is changed,
+          read_file keep lines of unchanged file so comparing them
+          is cheap
+    '''
+    lines = read_file('.lgit/index')
+    if _index[0] != lines:
+        _index[:] = [lines, [get_info_index(line) for line in lines]]
+    return _index[1]
 
 
 def get_data_object(hash_commit):
-    direc, file = split_dir_file(hash_commit)
-    path = '.lgit/objects/%s/%s' % (direc, file)
-    return read_file(path, mode='rb')
+    '''
+    Task: return content of object from loose object or packs
+    '''
+    return b''.join(iter_data_object(hash_commit))
+
+
+def iter_data_object(hash_commit):
+    '''
+    Task: return iterator of parts of content of object
+          object of large file is read chunk by chunk
+          so it can be written without keep all of it in memory
+    '''
+    path = pack_lgit.get_path_object(hash_commit)
+    if os.path.exists(path):
+        return pack_lgit.iter_loose_object(path)
+    location = pack_lgit.find_object(hash_commit)
+    if not location:
+        raise FileNotFoundError(path)
+    return pack_lgit.iter_packed_object(*location)
+
+
+def write_data_object(hash_commit, file):
+    '''
+    Task: write content of object into file without keep all of it
+          in memory, file is only opened after object is found
+    '''
+    path = pack_lgit.get_path_object(hash_commit)
+    if os.path.exists(path):
+        with open(file, 'wb') as f:
+            pack_lgit.write_loose_object(path, f)
+        return
+    parts = iter_data_object(hash_commit)
+    with open(file, 'wb') as f:
+        f.writelines(parts)
+
+
+def get_lines_text(data):
+    '''
+    Task: return lines of content like read text file
+          None if content is binary: it have NUL byte or
+          it can't be decoded as text, so it can't be merged by lines
+    '''
+    if b'\0' in data:
+        return None
+    try:
+        return TextIOWrapper(BytesIO(data)).readlines()
+    except UnicodeDecodeError:
+        return None
+
+
+def is_have_object(hash_f):
+    return (os.path.exists(pack_lgit.get_path_object(hash_f)) or
+            pack_lgit.find_object(hash_f) is not None)
 
 
 def get_tracked_commit(commit):
-    files = []
-    for line in read_file('.lgit/snapshots/%s' % (commit)):
-        files.append(line.strip()[41:])
-    return files
+    return list(get_files_hash(commit))
 
 
 def get_info_index(line):
@@ -82,7 +336,19 @@ def get_info_index(line):
     Task: return format timestamp, hash current, hash add, hash commit, path
     '''
     line = line.strip()
-    return line[0:14], line[15:55], line[56:96], line[97:137], line[138:]
+    # old index file haven't stat cache before path
+    start_path = 203 if STAT_PATTERN.match(line, 138) else 138
+    return line[0:14], line[15:55], line[56:96], line[97:137], \
+        line[start_path:]
+
+
+def get_stat_index(line):
+    '''
+    Task: return stat cache of file in line of index file
+    '''
+    if not STAT_PATTERN.match(line, 138):
+        return STAT_EMPTY
+    return tuple(int(line[i:i + 16], 16) for i in range(138, 202, 16))
 
 
 def get_info_snap(line):
@@ -105,6 +371,17 @@ def get_commit_branch(branch=''):
     return read_file(path)[0].strip()
 
 
+def get_commit_name(name):
+    '''
+    Task: return commit from name of branch or commit, None if not found
+    '''
+    if name in get_all_branchs():
+        return get_commit_branch(name)
+    if name and os.path.exists('.lgit/commits/%s' % (name)):
+        return name
+    return None
+
+
 def get_info_commit(commit):
     data = read_file(".lgit/commits/%s" % (commit))
     # format time commit, author, point commit, message commit
@@ -115,5 +392,18 @@ def get_author():
     return read_file('.lgit/config')[0].strip()
 
 
+def get_config(key, default=''):
+    '''
+    Task: return value of key in config file, default if it isn't set
+          first line of config file is author, each line after it
+          is "<key> <value>"
+    '''
+    for line in read_file('.lgit/config')[1:]:
+        name, _, value = line.strip().partition(' ')
+        if name == key:
+            return value
+    return default
+
+
 def get_cmit_create_b(branch):
     return read_file('.lgit/info/%s' % (branch))[0].strip()
@@ -1,15 +1,20 @@
 #!/usr/bin/env python3
 import os
-from time import time
-from sys import exit as exit_program
+from time import time, time_ns
+from sys import argv, exit as exit_program
 from args_lgit import handle_arguments, show_help_subcommand
 from utils import *
 from print_message import *
-import get_data_lgit as lgit_g
-import create_data_lgit as lgit_c
-import update_data_lgit as lgit_u
-import format_data_lgit as lgit_f
-from difflib import ndiff
+# modules are loaded when command use them first time
+lgit_g = lazy_import('get_data_lgit')
+lgit_c = lazy_import('create_data_lgit')
+lgit_u = lazy_import('update_data_lgit')
+lgit_f = lazy_import('format_data_lgit')
+pack_lgit = lazy_import('pack_lgit')
+gc_lgit = lazy_import('gc_lgit')
+graph_lgit = lazy_import('graph_lgit')
+diff_lgit = lazy_import('diff_lgit')
+daemon_lgit = lazy_import('daemon_lgit')
 
 
 def merge_git(branch_m):
@@ -49,16 +54,13 @@ def handle_conflict_added(files_clict_add, branch_merge):
     for file in files_clict_add.keys():
         data = files_clict_add[file]
 
-        # get location content
-        direc, h_file = split_dir_file(data[0])
-        origin = '.lgit/objects/%s/%s' % (direc, h_file)
-        direc, h_file = split_dir_file(data[1])
-        master = '.lgit/objects/%s/%s' % (direc, h_file)
-        direc, h_file = split_dir_file(data[2])
-        branch = '.lgit/objects/%s/%s' % (direc, h_file)
-
-        # get conflict or add
-        info = compare_origin(origin, master, branch)
+        # get conflict or add from hash of origin, master, branch
+        info = compare_origin(*data)
+        # binary file is kept as it is in current branch, it is conflict
+        if info is None:
+            print('warning: Cannot merge binary files: %s' % (file))
+            conflict_files.append(file)
+            continue
         data, is_conflict = compare_conflict(info, branch_merge)
         write_file(data, file)
         if is_conflict:
@@ -70,7 +72,7 @@ def compare_conflict(info, branch_m):
     data = []
     is_conflict = False
     for tag, master, branch in info:
-        if tag == 'equal' or tag == 'changes' or tag == 'insert':
+        if tag == 'equal' or tag == 'changes':
             data.append(''.join(master))
         elif tag == 'conflict':
             data.append(lgit_f.format_conflict(''.join(master),
@@ -87,7 +89,7 @@ def check_merge_branch(l_commit_b, branch_m):
     tracked_f_merge = lgit_g.get_files_hash(l_commit_b)
     l_commit_b_now = lgit_g.get_commit_branch()
     tracked_f = lgit_g.get_files_hash(l_commit_b_now)
-    origin_commit = read_file('.lgit/info/%s' % (branch_m))[0].strip()
+    origin_commit = graph_lgit.get_merge_base(l_commit_b_now, l_commit_b)
     origin_f = lgit_g.get_files_hash(origin_commit)
 
     files_modified = {}
@@ -124,159 +126,30 @@ def check_merge_branch(l_commit_b, branch_m):
 
 
 def compare_origin(origin, master, branch):
-
-    # readfile from ancentor and branch merge, current branch
-    origin_content = read_file(origin)
-    branch_content = read_file(branch)
-    master_content = read_file(master)
-
-    # compare origin with other branch
-    ori_b = list(ndiff(origin_content, branch_content))
-    ori_m = list(ndiff(origin_content, master_content))
-
-    # remove element have mark question
-    ori_b = remove_mark_compare(ori_b)
-    ori_m = remove_mark_compare(ori_m)
-    merge_file = []
-    i_bra = i_mas = 0
-
-    # print(ori_m)
-    # print(ori_b)
-
-    while i_bra < len(ori_b) and i_mas < len(ori_m):
-
-        if ori_b[i_bra][0] == " " and ori_m[i_mas][0] == ' ':
-            merge_file.append(['equal', ori_b[i_bra][2:], ''])
-            i_bra = i_bra + 1
-            i_mas = i_mas + 1
-
-        # when both file change or add more content
-        # when other file change content
-        # or at file is same origin but add or delete more content
-        # then mark is like conflict
-        elif ((ori_b[i_bra][0] == "-" and ori_m[i_mas][0] == '-') or
-                (ori_b[i_bra][0] == "+" and ori_m[i_mas][0] == '+') or
-                (ori_b[i_bra][0] == "+" and ori_m[i_mas][0] == '-') or
-                (ori_b[i_bra][0] == "-" and ori_m[i_mas][0] == '+')) or \
-             (((ori_b[i_bra][0] == " " and ori_m[i_mas][0] == '-') or
-                (ori_b[i_bra][0] == "-" and ori_m[i_mas][0] == ' ')) and
-              ((i_bra + 1 < len(ori_b) and ori_b[i_bra][0] == " " and
-                (ori_b[i_bra + 1][0] == '-' or ori_b[i_bra + 1][0] == '+')) or
-                (i_mas + 1 < len(ori_m) and ori_m[i_mas][0] == ' ' and
-                 (ori_m[i_mas + 1][0] == '-' or ori_m[i_mas + 1][0] == '+')))):
-
-            # define variable
-            master = []
-            branch = []
-
-            # add content when other file same at here but modified line after
-            if ori_m[i_mas][0] == ' ':
-                master.append(ori_m[i_mas][2:])
-                i_mas = i_mas + 1
-            elif ori_b[i_bra][0] == ' ':
-                branch.append(ori_b[i_bra][2:])
-                i_bra = i_bra + 1
-
-            # find add from 2 other branch
-            if not branch:
-                while i_bra < len(ori_b) and ori_b[i_bra][0] == '-':
-                    i_bra = i_bra + 1
-                while i_bra < len(ori_b) and ori_b[i_bra][0] == '+':
-                    branch.append(ori_b[i_bra][2:])
-                    i_bra = i_bra + 1
-
-            if not master:
-                while i_mas < len(ori_m) and ori_m[i_mas][0] == '-':
-                    i_mas = i_mas + 1
-                while i_mas < len(ori_m) and ori_m[i_mas][0] == '+':
-                    master.append(ori_m[i_mas][2:])
-                    i_mas = i_mas + 1
-
-            # store content have conflict
-            # if have conflict continous then add more from previous conflict
-            if merge_file and merge_file[-1][0] == 'conflict':
-                merge_file[-1][1] = merge_file[-1][1] + master
-                merge_file[-1][2] = merge_file[-1][2] + branch
-            else:
-                merge_file.append(['conflict', master, branch])
-
-        # only from other file changes not both file
-        elif ori_b[i_bra][0] == ' ' and ori_m[i_mas][0] == '-':
-            change = []
-            i_mas = i_mas + 1
-
-            # something it delete or change
-            # delete after '-' have not see '+'
-            while i_mas < len(ori_m) and ori_m[i_mas][0] == '+':
-                change.append(ori_m[i_mas][2:])
-                i_mas = i_mas + 1
-            
-            merge_file.append(['changes', change, ''])
-            i_bra = i_bra + 1
-        
-        elif ori_m[i_mas][0] == ' ' and ori_b[i_bra][0] == '-':
-            change = []
-            i_bra = i_bra + 1
-
-            while i_bra < len(ori_b) and ori_b[i_bra][0] == '+':
-                change.append(ori_b[i_bra][2:])
-                i_bra = i_bra + 1
-
-            merge_file.append(['changes', change, ''])
-            i_mas = i_mas + 1
-        else:
-            # when other file add more content at some line
-            insert = []
-            while i_bra < len(ori_b) and ori_b[i_bra][0] == '+':
-                insert.append(ori_b[i_bra][2:])
-                i_bra = i_bra + 1
-
-            while i_mas < len(ori_m) and ori_m[i_mas][0] == '+':
-                insert.append(ori_m[i_mas][2:])
-                i_mas = i_mas + 1
-            
-            merge_file.append(['insert', insert, ''])
-
-    # if other file still have content
-    if i_bra < len(ori_b):
-        merge_file.append(('insert', [e[2:] for e in ori_b[i_bra:]], ''))
-    if i_mas < len(ori_m):
-        merge_file.append(('insert', [e[2:] for e in ori_m[i_mas:]], ''))
-
-    # print(merge_file)
-    # for tag, master, branch in merge_file:
-    #     if tag == 'equal':
-    #         print(''.join(master), end='')
-    #     if tag == 'conflict':
-    #         print('<<<<<<<<<<<< Master')
-    #         print(''.join(master), end='')
-    #         print('===========')
-    #         print(''.join(branch), end='')
-    #         print('>>>>>>>>>>>> Branch')
-    #     if tag == 'changes':
-    #         print(''.join(master), end='')
-    #     if tag == 'insert':
-    #         print(''.join(master), end='')
-
-    return merge_file
-
-
-def remove_mark_compare(ori_b):
-    data = []
-    for i in ori_b:
-        if i[0] != '?':
-            data.append(i)
-    return data
+    '''
+    Task: merge content of file from ancestor, current branch, branch merge
+    :return: list of (tag, master, branch) from diff_lgit.merge3
+             None if one of them is binary, it can't be merged by lines
+    '''
+    # read object from ancentor and branch merge, current branch
+    lines = [lgit_g.get_lines_text(lgit_g.get_data_object(hash_f)
+                                   if hash_f else b'')
+             for hash_f in (origin, master, branch)]
+    if None in lines:
+        return None
+    return diff_lgit.merge3(*lines)
 
 
 def is_fast_forward(branch_m):
     '''
-    Task: checking time commit create of 2 branch
+    Task: checking last commit of current branch is ancestor of
+          last commit of other branch in commit graph
     :param branch_m: other branch merge to current branch
     :return: Boolean
     '''
-    commit_create_b = lgit_g.get_cmit_create_b(branch_m)
-    return commit_create_b and lgit_g.get_commit_branch() <= commit_create_b
+    commit_now = lgit_g.get_commit_branch()
+    return not commit_now or graph_lgit.is_ancestor(
+        commit_now, lgit_g.get_commit_branch(branch_m))
 
 
 def get_branch_commits(branch):
@@ -285,35 +158,160 @@ def get_branch_commits(branch):
     :param branch: branch want to get all of commits
     :return: list
     '''
-    commit = lgit_g.get_commit_branch(branch)
-    commits_branch = []
-    while commit:
-        commits_branch.append(commit)
-        _, _, commit, _ = lgit_g.get_info_commit(commit)
-    return commits_branch
+    return list(graph_lgit.iter_commits(lgit_g.get_commit_branch(branch)))
 
 
-def stash_git(aplly):
+def stash_git(action, stash):
     '''
-    Task: Stash the current changes or unstash from last time stash
-        + Is have apply then run unstash
-        + Checking is any changes at current branch
-        + Have changes then revert to last commit of current branch
-        + Don't have change --> Show message
-    :return: None
+    Task: Run action of stash stack, stash@{0} is last stash
+        + push (default): save changes then revert to last commit
+        + list: show all of stashes
+        + show: show files of stash
+        + apply: restore stash into working directory
+        + pop: apply stash then drop it when there isn't conflict
+        + drop: remove stash, clear: remove all of stashes
     '''
-    if aplly:
-        lgit_u.update_stash()
-        status_git()
+    if action in (None, 'push'):
+        push_stash()
+    elif action == 'list':
+        list_stash()
+    elif action == 'clear':
+        drop_stash(lgit_g.get_stashes())
     else:
-        modified_files = check_modified_file()
-        if modified_files:
-            lgit_c.create_stash(modified_files,
-                                lgit_f.format_time(time(), second=False))
-            revert_commit(lgit_g.get_branch_now())
-            print('Saved working directory')
+        name = get_stash(stash)
+        if name is None:
+            return
+        ref = 'stash@{%d}' % (lgit_g.get_stashes().index(name))
+        if action == 'show':
+            show_stash(name)
+        elif action == 'drop':
+            drop_stash([name])
+            print('Dropped %s (%s)' % (ref, name))
         else:
-            print('Nothing changes at all')
+            is_applied = apply_stash(name)
+            if action == 'pop' and is_applied:
+                drop_stash([name])
+                print('Dropped %s (%s)' % (ref, name))
+            elif action == 'pop':
+                print('The stash entry is kept in case you need it again.')
+            status_git()
+
+
+def push_stash():
+    '''
+    Task: Save changes at current branch then revert to last commit
+        + Don't have change --> Show message
+    '''
+    modified_files = check_modified_file()
+    if modified_files:
+        lgit_c.create_stash(modified_files,
+                            lgit_f.format_time(time(), second=False))
+        revert_commit(lgit_g.get_branch_now(), modified_files)
+        print('Saved working directory')
+    else:
+        print('Nothing changes at all')
+
+
+def get_stash(stash):
+    '''
+    Task: return name of stash record from stash@{n} or n
+          last stash when stash isn't passed, None if it is invalid
+    '''
+    stashes = lgit_g.get_stashes()
+    if not stashes:
+        print('No stash entries found.')
+        return None
+    number = stash or '0'
+    if number.startswith('stash@{') and number.endswith('}'):
+        number = number[7:-1]
+    if not number.isdigit() or int(number) >= len(stashes):
+        print('error: %s is not a valid reference' % (stash))
+        return None
+    return stashes[int(number)]
+
+
+def list_stash():
+    for number, name in enumerate(lgit_g.get_stashes()):
+        branch = lgit_g.get_stash_branch(name)
+        print('stash@{%d}: %s%s' % (number, 'WIP on %s: ' % (branch)
+                                     if branch else '',
+                                     lgit_f.format_date_log(name)))
+
+
+def show_stash(name):
+    '''
+    Task: show files of stash are new or modified from commit of stash
+    '''
+    commit = lgit_g.get_stash_commit(name)
+    files_origin = lgit_g.get_files_hash(commit) if commit else {}
+    for file in sorted(lgit_g.get_files_hash(name, mode='stash')):
+        print('\t%s %s' % ('modified:' if file in files_origin
+                           else 'new file:', file))
+
+
+def drop_stash(names):
+    '''
+    Task: remove records of stashes then remove their loose objects
+          aren't used by commits, index or other stashes
+    '''
+    objects = set()
+    for name in names:
+        objects.update(lgit_g.get_files_hash(name, mode='stash').values())
+        os.remove('.lgit/refs/stash/%s' % (name))
+    if objects:
+        for hash_f in list(objects):
+            objects.update(pack_lgit.get_chunks(hash_f))
+        for hash_f in lgit_g.iter_used_objects():
+            objects.discard(hash_f)
+        pack_lgit.remove_loose_objects(objects)
+
+
+def apply_stash(name):
+    '''
+    Task: Restore files of stash into working directory
+        + File isn't changed from commit of stash then overwrite it
+        + File is changed then merge it with content of stash
+          from its content at commit of stash (diff3)
+        + Binary file is changed then it isn't merged, it is conflict
+        + Old stash haven't commit then overwrite all of files
+    :return: True if stash is applied without conflict
+    '''
+    files_hash = lgit_g.get_files_hash(name, mode='stash')
+    commit = lgit_g.get_stash_commit(name)
+    if commit is None:
+        lgit_u.update_files_commit(files_hash)
+        print('Restore working directory')
+        return True
+    files_origin = lgit_g.get_files_hash(commit) if commit else {}
+    conflict = []
+    for file, hash_f in files_hash.items():
+        hash_origin = files_origin.get(file, '')
+        hash_now = hash_sha1(file) if os.path.exists(file) else hash_origin
+        if hash_now == hash_f:
+            continue
+        if hash_now == hash_origin:
+            lgit_u.update_content_file(file, hash_f)
+            continue
+        with open(file, 'rb') as f:
+            data_now = f.read()
+        lines = [lgit_g.get_lines_text(data) for data in (
+            lgit_g.get_data_object(hash_origin) if hash_origin else b'',
+            data_now, lgit_g.get_data_object(hash_f))]
+        # binary file is kept as it is now, it is conflict
+        if None in lines:
+            print('warning: Cannot merge binary files: %s' % (file))
+            conflict.append(file)
+            continue
+        info = diff_lgit.merge3(*lines)
+        data, is_conflict = compare_conflict(info, 'stash')
+        write_file(data, file)
+        if is_conflict:
+            conflict.append(file)
+    print('Restore working directory')
+    if conflict:
+        print("Merge auto conflict:\n\
+Fail to merge file:\n\t%s" % ("\n\t".join(conflict)), sep='')
+    return not conflict
 
 
 def show_branch():
@@ -365,50 +363,52 @@ def is_invalid_branch(branch):
     return branch not in branchs
 
 
-def revert_commit(branch):
+def revert_commit(branch, modified=()):
+    '''
+    Task: Change working directory and index file to last commit of branch
+        + Compare hash of 2 commits, only write or remove files different
+          without read other files in working directory
+        + Modified files are reverted to commit of branch too
+    :param modified: files are modified at branch now
+    '''
     commit = lgit_g.get_commit_branch(branch=branch)
-    files_hash = lgit_g.get_files_hash(commit)
-    files_update = lgit_u.update_files_commit(files_hash)
-    remove_untracked_commit(files_update)
-    overwrite_index(files_hash)
-
-
-def remove_untracked_commit(files_update):
-    tracked, _ = lgit_g.get_tracked_unstracked()
-    untracked_file = [f for f in tracked if f not in files_update]
-    for file in untracked_file:
-        os.remove(file)
-        remove_empty_dirs(file)
+    files_diff = lgit_g.diff_commits(lgit_g.get_commit_branch(), commit)
+    if modified:
+        files_hash = lgit_g.get_files_hash(commit) if commit else {}
+        for file in modified:
+            if file not in files_diff:
+                files_diff[file] = ('', files_hash.get(file, ''))
+    lgit_u.update_files_diff(files_diff)
+    lgit_u.update_index_diff(files_diff)
 
 
 def check_modified_file():
     '''
     return list file is modified at branch now
     '''
-    tracked, _ = lgit_g.get_tracked_unstracked()
+    tracked = lgit_g.get_tracked_files()
     lgit_u.update_index(tracked, mode='status')
     staged, unstaged = lgit_g.get_staged_unstaged()
     return staged + unstaged
 
 
-def overwrite_index(files_hash):
+def config_git(author=None, chunks=None):
     '''
-    Task: overwrite index at time commit
-    :param files_hash: a dictionary: key is file,
-            value is hash of file at time commit
-    :return: None
+    Task: store author and other keys of config into config file
+          option isn't passed keep its value in config file
     '''
     data = []
-    for file in files_hash.keys():
-        hash_f = files_hash[file]
-        line = lgit_f.format_index(lgit_f.format_time(os.path.getmtime(file)),
-                                   hash_f, hash_f, hash_f, file)
-        data.append(line)
-    write_file(data, '.lgit/index')
-
-
-def config_git(author):
-    write_file(['%s\n' % (author)], file='.lgit/config')
+    if os.path.exists('.lgit/config'):
+        data = read_file('.lgit/config')
+    # first line is always author
+    data = data or ['%s\n' % (os.environ.get('LOGNAME'))]
+    if author is not None:
+        data[:1] = ['%s\n' % (author)]
+    if chunks is not None:
+        data = data[:1] + [line for line in data[1:]
+                           if line.split(' ')[0] != 'chunks']
+        data.append('chunks %s\n' % (chunks))
+    write_file_atomic(data, file='.lgit/config')
 
 
 def handle_raw_input(files_user, tracked_file='', mode=''):
@@ -471,8 +471,10 @@ def add_git(files_add):
     '''
     files_new = handle_raw_input(files_add, mode='add')
     if files_new:
-        lgit_u.update_index(files_new, mode='add')
-        lgit_c.create_object(files_new)
+        time_write = time_ns()
+        files_hash = lgit_c.create_object(files_new)
+        lgit_u.update_index(files_new, mode='add', files_hash=files_hash,
+                            time_write=time_write)
 
 
 def status_git():
@@ -520,11 +522,13 @@ def commit_git(message):
     tracked_files, _ = lgit_g.get_tracked_unstracked()
     staged_files, _ = lgit_g.get_staged_unstaged()
     if staged_files:
-        lgit_u.update_index(tracked_files, mode='commit')
-        time_commit = lgit_f.format_time(time(), second=False)
-        lgit_c.create_commit(message, time_commit)
-        lgit_c.create_snapshot('.lgit/snapshots/%s' % (time_commit))
-        lgit_u.update_commit_branch(time_commit)
+        # index, commit, snapshot and branch are replaced together
+        with batch_writes():
+            lgit_u.update_index(tracked_files, mode='commit')
+            time_commit = lgit_f.format_time(time(), second=False)
+            lgit_c.create_commit(message, time_commit)
+            lgit_c.create_snapshot('.lgit/snapshots/%s' % (time_commit))
+            lgit_u.update_commit_branch(time_commit)
     else:
         show_status()
 
@@ -540,17 +544,17 @@ def log_git():
 
 
 def show_log(commit):
-    if commit:
-        time_commit, author, p_commit, message = lgit_g.get_info_commit(commit)
+    # go up parents of commit in commit graph, print each commit found
+    for commit in graph_lgit.iter_commits(commit):
+        time_commit, author, _, message = lgit_g.get_info_commit(commit)
         date = lgit_f.format_date_log(time_commit)
         print("%scommit %s%s\nAuthor: %s\nDate: %s\n\n\t%s\n\n" %
               (COLORS.RED, commit, COLORS.ENDC, author, date, message))
-        show_log(p_commit)
 
 
 def ls_files_git():
-    tracked_file, _ = lgit_g.get_tracked_unstracked()
-    files = get_trackfile_cwd(tracked_file)
+    # only index is read, working directory isn't scanned
+    files = get_trackfile_cwd(lgit_g.get_tracked_files())
     if files:
         print("\n".join(sorted(files, key=str)))
 
@@ -587,7 +591,98 @@ def rm_git(files):
                 os.remove(file)
                 remove_empty_dirs(file)
             data_index[line] = ""
-        write_file(data_index, file='.lgit/index')
+        write_file_atomic(data_index, file='.lgit/index')
+
+
+def diff_git(cached, names):
+    '''
+    Task: Show changes between working directory, index and commits
+        + No commit: working directory with index
+        + --cached: index with commit, default is last commit of branch
+        + One commit: working directory with commit
+        + Two commits: first commit with second commit
+        + Path have same hash at 2 sides is skipped without reading it
+        + Diff is printed file by file
+    '''
+    commits = []
+    for name in names:
+        commit = lgit_g.get_commit_name(name)
+        if commit is None:
+            print("fatal: bad revision '%s'" % (name))
+            return
+        commits.append(commit)
+    if len(commits) == 2:
+        files_diff = lgit_g.diff_commits(*commits)
+        show_diff({file: (hashs[0], hashs[1], False)
+                   for file, hashs in files_diff.items()})
+        return
+    tracked = lgit_g.get_tracked_files()
+    if not cached:
+        lgit_u.update_index(tracked, mode='status')
+    files_index = lgit_g.get_hash_index()
+    if commits:
+        files_old = lgit_g.get_files_hash(commits[0]) if commits[0] else {}
+    elif cached:
+        commit = lgit_g.get_commit_branch()
+        files_old = lgit_g.get_files_hash(commit) if commit else {}
+    else:
+        files_old = {file: hashs[1] for file, hashs in files_index.items()}
+    files_diff = {}
+    for file in set(files_old) | set(files_index):
+        h_current, h_add, _ = files_index.get(file, ('', '', ''))
+        if cached:
+            files_diff[file] = (files_old.get(file, ''), h_add, False)
+        elif file in files_index and os.path.exists(file):
+            files_diff[file] = (files_old.get(file, ''), h_current, True)
+        else:
+            files_diff[file] = (files_old.get(file, ''), '', False)
+    show_diff(files_diff)
+
+
+def show_diff(files_diff):
+    '''
+    Task: print unified diff of each file have different hash
+    :param files_diff: a dictionary key is file, value is old hash,
+                       new hash, new content is read from working directory
+    '''
+    for file in sorted(files_diff):
+        hash_old, hash_new, is_working = files_diff[file]
+        if hash_old == hash_new:
+            continue
+        content_old = lgit_g.get_data_object(hash_old) if hash_old else b''
+        if is_working:
+            with open(file, 'rb') as f:
+                content_new = f.read()
+        else:
+            content_new = lgit_g.get_data_object(hash_new) if hash_new else b''
+        name_old = 'a/' + file if hash_old else '/dev/null'
+        name_new = 'b/' + file if hash_new else '/dev/null'
+        print('diff --lgit a/%s b/%s' % (file, file))
+        if b'\0' in content_old or b'\0' in content_new:
+            print('Binary files %s and %s differ' % (name_old, name_new))
+            continue
+        for line in diff_lgit.unified_diff(
+                content_old.decode(errors='replace').splitlines(True),
+                content_new.decode(errors='replace').splitlines(True),
+                name_old, name_new):
+            print(line, end='')
+
+
+def gc_git(prune):
+    '''
+    Task: Remove unused objects then pack objects are left
+        + Mark objects used by snapshots, stashes and index
+        + Remove objects aren't marked and older than grace period
+        + Pack all of loose objects and old packs into one pack
+    :param prune: grace period in days, None is default period
+    '''
+    grace = gc_lgit.GRACE_PERIOD if prune is None else prune * 86400
+    removed, size, number = gc_lgit.collect_garbage(grace)
+    print('Removed %d unused objects, reclaimed %d bytes' % (removed, size))
+    if number:
+        print('Packed %d objects' % (number))
+    else:
+        print('Nothing to pack')
 
 
 def handle_init_dest(dest):
@@ -621,8 +716,10 @@ def check_strucsture_lgit():
 
 
 def setup_lgit():
+    if not pack_lgit.is_format_current():
+        pack_lgit.upgrade_objects()
     if not read_file('.lgit/config'):
-        config_git(author=os.environ.get('LOGNAME'))
+        config_git(author=str(os.environ.get('LOGNAME')))
     if not read_file('.lgit/HEAD'):
         write_file(['ref: refs/heads/master'], '.lgit/HEAD')
     if not read_file('.lgit/info/master'):
@@ -657,12 +754,28 @@ def format_path(path, mode):
 
 
 def main():
+    # daemon of repository is running then it run command
+    if len(argv) > 1 and argv[1] != 'daemon' and \
+            daemon_lgit.send_command(argv[1:]):
+        return
+    run_command()
+
+
+def run_command():
     args, parser = handle_arguments()
+    set_jobs(getattr(args, 'jobs', None))
     try:
         if args.command == 'init':
             handle_init_dest(args.dest)
             init_git()
         elif find_parent_git():
+            if args.command != 'daemon':
+                is_current = pack_lgit.is_format_current()
+                lock_repo(shared=args.command in ('log', 'ls-files') and
+                          is_current)
+                # objects of old lgit are converted one time
+                if not is_current:
+                    pack_lgit.upgrade_objects()
             if (not os.path.exists('.lgit/config') and
                     args.command == 'commit'):
                 MISSING_AUTHOR()
@@ -673,12 +786,15 @@ def main():
                 show_help_subcommand(parser, 'checkout')
             elif args.command == 'merge' and not args.branch:
                 show_help_subcommand(parser, 'merge')
-            elif args.command == 'config' and not args.author:
+            elif (args.command == 'config' and not args.author and
+                    not args.chunks):
                 show_help_subcommand(parser, 'config')
             elif args.command == 'add' and not args.file:
                 NOFILE_ADDED()
             elif args.command == 'rm' and not args.file:
                 show_help_subcommand(parser, 'rm')
+            elif args.command == 'diff' and len(args.commit) > 2:
+                show_help_subcommand(parser, 'diff')
             elif args.command == 'add':
                 add_git(args.file)
             elif args.command == 'status':
@@ -686,7 +802,7 @@ def main():
             elif args.command == 'commit':
                 commit_git(args.message)
             elif args.command == 'config':
-                config_git(args.author)
+                config_git(args.author, args.chunks)
             elif args.command == 'ls-files':
                 ls_files_git()
             elif args.command == 'log':
@@ -698,9 +814,15 @@ def main():
             elif args.command == 'branch':
                 branch_git(args.name)
             elif args.command == 'stash':
-                stash_git(args.apply)
+                stash_git(args.action, args.stash)
             elif args.command == 'merge':
                 merge_git(args.branch)
+            elif args.command == 'gc':
+                gc_git(args.prune)
+            elif args.command == 'diff':
+                diff_git(args.cached, args.commit)
+            elif args.command == 'daemon':
+                daemon_lgit.serve()
         else:
             print('fatal: not a git repository (or any \
 of the parent directories)')
@@ -708,6 +830,9 @@ of the parent directories)')
         print('fatal: not a git repository (or any of the parent directories)')
     except IsADirectoryError:
         pass
+    finally:
+        sync_files()
+        unlock_repo()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,196 @@
+import os
+from struct import Struct
+from utils import read_file, write_file, write_file_atomic, sync_later
+from utils import is_lock_shared
+
+# commit graph: header, then one row for each commit sorted by commit
+#       each row: commit, position of parent row (-1 if no parent),
+#                 generation (number of commits from first commit)
+# new commit is appended at the end of commit graph
+GRAPH_FILE = '.lgit/commit-graph'
+GRAPH_MAGIC = b'LGCG'
+GRAPH_VERSION = 1
+HEADER = Struct('>4sI')
+ROW = Struct('>21siI')
+
+# content of commit graph loaded in this process and its stat
+_graph = None
+_graph_stat = None
+
+
+def load_graph():
+    '''
+    Task: return content of commit graph, build it if it doesn't exist
+    '''
+    global _graph
+    if _graph is None and not os.path.exists(GRAPH_FILE):
+        write_graph()
+    if _graph is None:
+        with open(GRAPH_FILE, 'rb') as f:
+            data = f.read()
+        magic, version = HEADER.unpack_from(data)
+        if magic != GRAPH_MAGIC or version != GRAPH_VERSION:
+            raise ValueError('commit graph is corrupt')
+        _graph = data
+    return _graph
+
+
+def refresh_graph():
+    '''
+    Task: forget commit graph loaded if other process changed it
+    '''
+    global _graph, _graph_stat
+    try:
+        info = os.stat(GRAPH_FILE)
+        stat_g = (info.st_mtime_ns, info.st_size, info.st_ino)
+    except FileNotFoundError:
+        stat_g = None
+    if stat_g != _graph_stat:
+        _graph = None
+        _graph_stat = stat_g
+
+
+def count_rows():
+    return (len(load_graph()) - HEADER.size) // ROW.size
+
+
+def get_row(pos):
+    '''
+    Task: return commit, position of parent, generation of row
+    '''
+    commit, parent, generation = ROW.unpack_from(
+        load_graph(), HEADER.size + pos * ROW.size)
+    return commit.decode(), parent, generation
+
+
+def find_commit(commit):
+    '''
+    Task: return position of commit in commit graph, None if not found
+        + Commit is time commit so rows is sorted, binary search it
+        + Clock of machine go back then check all of rows
+    '''
+    low, high = 0, count_rows()
+    while low < high:
+        middle = (low + high) // 2
+        commit_m, _, _ = get_row(middle)
+        if commit_m == commit:
+            return middle
+        elif commit_m < commit:
+            low = middle + 1
+        else:
+            high = middle
+    for pos in range(count_rows()):
+        if get_row(pos)[0] == commit:
+            return pos
+    return None
+
+
+def get_position(commit):
+    '''
+    Task: return position of commit, rebuild commit graph if it is old
+    '''
+    pos = find_commit(commit)
+    if pos is None:
+        write_graph()
+        pos = find_commit(commit)
+    if pos is None:
+        raise ValueError("commit '%s' not found" % (commit))
+    return pos
+
+
+def get_parent_commit(commit):
+    return read_file('.lgit/commits/%s' % (commit))[2].strip()
+
+
+def write_graph():
+    '''
+    Task: build commit graph from all of commits in commits directory
+          command hold shared lock only keep it in memory
+    '''
+    global _graph
+    commits = sorted(os.listdir('.lgit/commits'))
+    positions = {commit: pos for pos, commit in enumerate(commits)}
+    parents = [positions.get(get_parent_commit(commit), -1)
+               for commit in commits]
+    generations = [0] * len(commits)
+    for pos in range(len(commits)):
+        # find ancestors haven't generation then count from oldest one
+        chain = []
+        while pos != -1 and not generations[pos]:
+            chain.append(pos)
+            pos = parents[pos]
+        generation = generations[pos] if pos != -1 else 0
+        for pos in reversed(chain):
+            generation = generation + 1
+            generations[pos] = generation
+    data = [HEADER.pack(GRAPH_MAGIC, GRAPH_VERSION)]
+    for pos, commit in enumerate(commits):
+        data.append(ROW.pack(commit.encode(), parents[pos],
+                             generations[pos]))
+    if is_lock_shared():
+        _graph = b''.join(data)
+        return
+    write_file_atomic(data, GRAPH_FILE, mode='wb')
+    _graph = None
+
+
+def add_commit(commit, parent):
+    '''
+    Task: append new commit at the end of commit graph
+          commit graph is old then rebuild it with new commit
+    '''
+    global _graph
+    if not os.path.exists(GRAPH_FILE):
+        write_graph()
+        return
+    # last row is written a part when process crashed then rebuild it
+    if (len(load_graph()) - HEADER.size) % ROW.size:
+        write_graph()
+        return
+    pos_parent = find_commit(parent) if parent else -1
+    if pos_parent is None:
+        write_graph()
+        return
+    generation = get_row(pos_parent)[2] + 1 if parent else 1
+    write_file([ROW.pack(commit.encode(), pos_parent, generation)],
+               GRAPH_FILE, mode='ab')
+    sync_later(GRAPH_FILE)
+    _graph = None
+
+
+def iter_commits(commit):
+    '''
+    Task: yield commit and all of its ancestors from newest to oldest
+    '''
+    pos = get_position(commit) if commit else -1
+    while pos != -1:
+        commit, pos, _ = get_row(pos)
+        yield commit
+
+
+def get_merge_base(commit_a, commit_b):
+    '''
+    Task: return nearest common ancestor of 2 commits, '' if not found
+        + Go up from commit have bigger generation until same generation
+        + Then go up both of them until same commit
+    '''
+    if not commit_a or not commit_b:
+        return ''
+    pos_a, pos_b = get_position(commit_a), get_position(commit_b)
+    while pos_a != -1 and pos_b != -1 and pos_a != pos_b:
+        _, parent_a, generation_a = get_row(pos_a)
+        _, parent_b, generation_b = get_row(pos_b)
+        if generation_a >= generation_b:
+            pos_a = parent_a
+        if generation_b >= generation_a:
+            pos_b = parent_b
+    if pos_a == -1 or pos_b == -1:
+        return ''
+    return get_row(pos_a)[0]
+
+
+def is_ancestor(ancestor, commit):
+    '''
+    Task: return True if ancestor is commit or is ancestor of commit
+    '''
+    return get_merge_base(ancestor, commit) == ancestor
@@ -0,0 +1,872 @@
+import os
+import zlib
+import mmap
+from collections import OrderedDict
+from hashlib import sha1
+from heapq import merge
+from operator import itemgetter
+from struct import Struct
+from utils import write_file_atomic, split_dir_file, make_temp_file
+from utils import sync_later, sync_files, read_chunks, read_file
+from utils import BUFFER_SIZE, lazy_import
+
+# only loaded when objects are repacked
+tempfile = lazy_import('tempfile')
+
+# pack file: header, then each object is type of object + data
+#       full object: zlib content
+#       delta object: hash of base object + zlib instructions of delta
+#       chunks object: zlib list of chunks of large file
+# index of pack: header, entries sorted by hash, sha1 of all before
+#       each entry: hash of object, offset and length of object in pack
+PACK_DIREC = '.lgit/objects/pack'
+PACK_MAGIC = b'LGPK'
+INDEX_MAGIC = b'LGPI'
+PACK_VERSION = 3
+PACK_VERSIONS_READ = (1, 2, 3)
+HEADER = Struct('>4sII')
+INDEX_ENTRY = Struct('>20sQQ')
+OBJ_FULL = b'\x01'
+OBJ_DELTA = b'\x02'
+OBJ_CHUNKS = b'\x03'
+# loose object of large file: magic then zlib list of its chunks
+#       each line is "<hash of chunk> <size of chunk>"
+# zlib data always begin with 0x78 so magic isn't same as it
+CHUNKS_MAGIC = b'LGCK'
+# version of format of loose objects of repository
+#       no file: objects can be stored before compression (old lgit)
+#       1: each loose object is zlib data or list of chunks
+FORMAT_FILE = '.lgit/format'
+OBJECT_FORMAT = 1
+# delta: size of base and size of result, then list of instructions
+#       copy: offset and length of data copied from base
+#       insert: length of data then data inserted
+DELTA_HEADER = Struct('>QQ')
+OP_COPY = 0
+OP_INSERT = 1
+DELTA_COPY = Struct('>BQQ')
+DELTA_INSERT = Struct('>BQ')
+# size of block in base object is indexed to find copy
+DELTA_BLOCK = 16
+# maximum number of deltas read to build one object
+MAX_DEPTH = 50
+# number of objects content kept in memory while repack
+CACHE_SIZE = 4
+# number of index entries sorted in memory at a time while repack
+# more entries are sorted in temporary files then merged from them
+RUN_SIZE = 64 * 1024
+# bloom filter use 10 bits and 5 positions for each object
+# then about 1% of objects are found by mistake
+# sha1 is random then its 5 parts of 4 bytes are used as 5 positions
+BITS_PER_OBJECT = 10
+POSITIONS = Struct('>5I')
+# object bigger than buffer size is mapped into memory and decompressed
+# by parts, each time zlib get this size of compressed data
+READ_SIZE = 64 * 1024
+
+# index of pack files mapped into memory in this process
+_indexes = {}
+
+
+class BloomFilter:
+    '''
+    Task: set of hashes of objects in fixed memory
+        + Hash added is always found
+        + Hash isn't added can be found by mistake, then gc only keep
+          unused object, repack only store object without delta
+    Example:
+        marked = BloomFilter(1000)
+        marked.add(hash_b)
+        print(hash_b in marked)
+    '''
+
+    def __init__(self, number):
+        self.size = max(number, 1024) * BITS_PER_OBJECT
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def get_positions(self, hash_b):
+        return [value % self.size for value in POSITIONS.unpack(hash_b)]
+
+    def add(self, hash_b):
+        for pos in self.get_positions(hash_b):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, hash_b):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7))
+                   for pos in self.get_positions(hash_b))
+
+
+def get_path_object(hash_f):
+    return '.lgit/objects/%s/%s' % split_dir_file(hash_f)
+
+
+def read_loose_object(path):
+    '''
+    Task: return content of loose object
+    '''
+    return b''.join(iter_loose_object(path))
+
+
+def iter_loose_object(path):
+    '''
+    Task: yield content of loose object by parts
+    '''
+    with open(path, 'rb') as f:
+        yield from iter_loose_file(f)
+
+
+def write_loose_object(path, f_out):
+    '''
+    Task: write content of loose object into opened file part by part
+    '''
+    with open(path, 'rb') as f:
+        f_out.writelines(iter_loose_file(f))
+
+
+def iter_loose_file(f):
+    '''
+    Task: yield content of opened loose object by parts
+        + Object stored by chunks is yielded chunk by chunk
+        + Large object is mapped into memory then decompressed part
+          by part, so its content is never kept all in memory
+    '''
+    size = os.fstat(f.fileno()).st_size
+    if f.read(len(CHUNKS_MAGIC)) == CHUNKS_MAGIC:
+        yield from iter_list_chunks(zlib.decompress(f.read()))
+    elif size > BUFFER_SIZE:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield from iter_decompress(data, 0, size)
+    else:
+        f.seek(0)
+        yield zlib.decompress(f.read())
+
+
+def is_format_current():
+    '''
+    Task: return True if loose objects of repository have current format
+    '''
+    try:
+        lines = read_file(FORMAT_FILE)
+    except FileNotFoundError:
+        return False
+    return bool(lines) and lines[0].strip() == str(OBJECT_FORMAT)
+
+
+def upgrade_objects():
+    '''
+    Task: compress loose objects stored before compression by old lgit
+          then write version of format, so format of loose object is
+          never guessed from its first bytes when it is read
+        + Object stored before compression is found because its data
+          have its hash, data of compressed object or list of chunks
+          haven't hash of content of file
+        + Compressed object keep modified time of old object
+    '''
+    for direc in os.listdir('.lgit/objects'):
+        path_direc = os.path.join('.lgit/objects', direc)
+        if len(direc) != 2 or not os.path.isdir(path_direc):
+            continue
+        for name in os.listdir(path_direc):
+            path = os.path.join(path_direc, name)
+            hash_f = sha1()
+            for chunk in read_chunks(path):
+                hash_f.update(chunk)
+            if hash_f.hexdigest() == direc + name:
+                compress_loose_object(path)
+    write_file_atomic(['%d\n' % (OBJECT_FORMAT)], FORMAT_FILE)
+
+
+def compress_loose_object(path):
+    '''
+    Task: replace object stored before compression by zlib object
+    '''
+    info = os.stat(path)
+    compress = zlib.compressobj()
+    fd, path_tmp = make_temp_file('.lgit/objects', 'tmp_obj_')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in read_chunks(path):
+                f.write(compress.compress(chunk))
+            f.write(compress.flush())
+        os.utime(path_tmp, ns=(info.st_atime_ns, info.st_mtime_ns))
+        os.replace(path_tmp, path)
+        sync_later(path)
+    except BaseException:
+        if os.path.exists(path_tmp):
+            os.remove(path_tmp)
+        raise
+
+
+def iter_decompress(data, start, end):
+    '''
+    Task: yield content of zlib data[start:end] by parts not bigger than
+          buffer size, slices of data are copied only when zlib use them
+          so data can be memory map of large file
+    '''
+    decompress = zlib.decompressobj()
+    for pos in range(start, end, READ_SIZE):
+        part = data[pos:min(pos + READ_SIZE, end)]
+        while part:
+            content = decompress.decompress(part, BUFFER_SIZE)
+            if content:
+                yield content
+            part = decompress.unconsumed_tail
+        if decompress.eof:
+            break
+    if not decompress.eof:
+        raise zlib.error('compressed object is truncated')
+
+
+def iter_list_chunks(list_chunks):
+    '''
+    Task: yield content of each chunk in list of chunks of object
+    '''
+    for line in list_chunks.decode().splitlines():
+        hash_c, size = line.split()
+        content = read_chunk(hash_c)
+        if len(content) != int(size):
+            raise ValueError('chunk %s has wrong size' % (hash_c))
+        yield content
+
+
+def read_chunk(hash_f):
+    '''
+    Task: return content of chunk from loose object or packs
+    '''
+    path = get_path_object(hash_f)
+    if os.path.exists(path):
+        return read_loose_object(path)
+    content = read_object(hash_f)
+    if content is None:
+        raise FileNotFoundError(path)
+    return content
+
+
+def format_list_chunks(chunks):
+    '''
+    Task: return data of loose object of large file from its chunks
+    :param chunks: list of hash and size of each chunk
+    '''
+    return CHUNKS_MAGIC + zlib.compress(''.join(
+        ['%s %d\n' % (hash_c, size) for hash_c, size in chunks]).encode())
+
+
+def get_packs():
+    '''
+    Task: return list name of packs have index in lgit database
+    '''
+    if not os.path.isdir(PACK_DIREC):
+        return []
+    return sorted(f[:-4] for f in os.listdir(PACK_DIREC)
+                  if f.endswith('.idx'))
+
+
+def load_index(pack):
+    '''
+    Task: return number of objects and content of index of pack
+          index is mapped into memory so it isn't read into memory
+          of process, only its pages are used are read from disk
+    '''
+    if pack not in _indexes:
+        with open('%s/%s.idx' % (PACK_DIREC, pack), 'rb') as f:
+            body = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(body)
+        with memoryview(body) as view, view[:-20] as data:
+            is_valid = sha1(data).digest() == body[-20:]
+        if (magic != INDEX_MAGIC or version not in PACK_VERSIONS_READ or
+                not is_valid):
+            body.close()
+            raise ValueError('pack index %s is corrupt' % (pack))
+        _indexes[pack] = count, body
+    return _indexes[pack]
+
+
+def close_index(pack):
+    if pack in _indexes:
+        _indexes.pop(pack)[1].close()
+
+
+def find_in_pack(pack, hash_b):
+    '''
+    Task: binary search hash of object in index of pack
+    return offset and length of object in pack, None if not found
+    '''
+    count, body = load_index(pack)
+    low, high = 0, count
+    while low < high:
+        middle = (low + high) // 2
+        hash_m, offset, length = INDEX_ENTRY.unpack_from(
+            body, HEADER.size + middle * INDEX_ENTRY.size)
+        if hash_m == hash_b:
+            return offset, length
+        elif hash_m < hash_b:
+            low = middle + 1
+        else:
+            high = middle
+    return None
+
+
+def find_object(hash_f):
+    '''
+    Task: return pack, offset, length of object, None if not in any pack
+    '''
+    hash_b = bytes.fromhex(hash_f)
+    for pack in get_packs():
+        location = find_in_pack(pack, hash_b)
+        if location:
+            return (pack,) + location
+    return None
+
+
+def read_packed(pack, offset, length):
+    with open('%s/%s.pack' % (PACK_DIREC, pack), 'rb') as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+def read_object(hash_f):
+    '''
+    Task: return content of object in packs, None if not found
+    '''
+    location = find_object(hash_f)
+    if not location:
+        return None
+    return read_packed_object(*location)
+
+
+def read_packed_object(pack, offset, length):
+    '''
+    Task: return content of object at location in pack
+    '''
+    return b''.join(iter_packed_object(pack, offset, length))
+
+
+def iter_packed_object(pack, offset, length):
+    '''
+    Task: yield content of object at location in pack by parts
+        + Large full object: map pack into memory then decompress
+          object part by part
+        + Chunks object: yield content of its chunks one by one
+        + Delta object: read base objects until full object
+          then apply all of deltas from full object
+    '''
+    if length > BUFFER_SIZE:
+        with open('%s/%s.pack' % (PACK_DIREC, pack), 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[offset:offset + 1] == OBJ_FULL:
+                yield from iter_decompress(data, offset + 1, offset + length)
+                return
+    deltas = []
+    data = read_packed(pack, offset, length)
+    if data[:1] == OBJ_CHUNKS:
+        yield from iter_list_chunks(zlib.decompress(data[1:]))
+        return
+    while data[:1] == OBJ_DELTA:
+        deltas.append(zlib.decompress(data[21:]))
+        hash_b = data[1:21]
+        # base object is packed in same pack
+        location = find_in_pack(pack, hash_b)
+        if not location:
+            raise ValueError('pack %s miss base object %s' %
+                             (pack, hash_b.hex()))
+        data = read_packed(pack, *location)
+    content = zlib.decompress(data[1:])
+    for delta in reversed(deltas):
+        content = apply_delta(content, delta)
+    yield content
+
+
+def make_delta(base, target):
+    '''
+    Task: return instructions build target from base
+        + Index each block of base by its content
+        + Scan target: block found in base then extend it to copy
+          as long as possible, else byte is inserted
+    '''
+    blocks = {}
+    for offset in range(len(base) - DELTA_BLOCK, -1, -DELTA_BLOCK):
+        blocks[base[offset:offset + DELTA_BLOCK]] = offset
+    delta = [DELTA_HEADER.pack(len(base), len(target))]
+    start_insert = i = 0
+    while i <= len(target) - DELTA_BLOCK:
+        offset = blocks.get(target[i:i + DELTA_BLOCK])
+        if offset is None:
+            i = i + 1
+            continue
+        length = DELTA_BLOCK + match_length(base, offset + DELTA_BLOCK,
+                                            target, i + DELTA_BLOCK)
+        # extend copy back into data waiting to insert
+        while (i > start_insert and offset > 0 and
+               base[offset - 1] == target[i - 1]):
+            i, offset, length = i - 1, offset - 1, length + 1
+        if i > start_insert:
+            delta.append(DELTA_INSERT.pack(OP_INSERT, i - start_insert))
+            delta.append(target[start_insert:i])
+        delta.append(DELTA_COPY.pack(OP_COPY, offset, length))
+        i = start_insert = i + length
+    if start_insert < len(target):
+        delta.append(DELTA_INSERT.pack(OP_INSERT,
+                                       len(target) - start_insert))
+        delta.append(target[start_insert:])
+    return b''.join(delta)
+
+
+def match_length(base, start_b, target, start_t):
+    '''
+    Task: return length of same data from start of base and target
+          compare big slices first then smaller slices
+    '''
+    length = 0
+    maximum = min(len(base) - start_b, len(target) - start_t)
+    step = 4096
+    while step:
+        while (length + step <= maximum and
+               base[start_b + length:start_b + length + step] ==
+               target[start_t + length:start_t + length + step]):
+            length = length + step
+        step = step // 2
+    return length
+
+
+def apply_delta(base, delta):
+    '''
+    Task: return content built from base by instructions of delta
+    '''
+    size_base, size_target = DELTA_HEADER.unpack_from(delta)
+    if size_base != len(base):
+        raise ValueError('delta does not match base object')
+    base = memoryview(base)
+    content = bytearray()
+    pos = DELTA_HEADER.size
+    while pos < len(delta):
+        if delta[pos] == OP_COPY:
+            _, offset, length = DELTA_COPY.unpack_from(delta, pos)
+            pos = pos + DELTA_COPY.size
+            content += base[offset:offset + length]
+        else:
+            _, length = DELTA_INSERT.unpack_from(delta, pos)
+            pos = pos + DELTA_INSERT.size
+            content += delta[pos:pos + length]
+            pos = pos + length
+    if len(content) != size_target:
+        raise ValueError('delta build wrong size of object')
+    return bytes(content)
+
+
+def iter_object_direcs():
+    '''
+    Task: yield entry of each directory of loose objects
+    '''
+    with os.scandir('.lgit/objects') as entries:
+        for entry in entries:
+            if len(entry.name) == 2 and entry.is_dir():
+                yield entry
+
+
+def count_objects():
+    '''
+    Task: return number of loose objects and objects in packs
+    '''
+    number = 0
+    for direc in iter_object_direcs():
+        number = number + len(os.listdir(direc.path))
+    for pack in get_packs():
+        number = number + load_index(pack)[0]
+    return number
+
+
+def get_loose_direc(direc, unused=()):
+    '''
+    Task: return hash and location of loose objects in one directory
+          of objects sorted by hash, object in unused is left out
+    '''
+    objects = []
+    for file in sorted(os.listdir('.lgit/objects/%s' % (direc))):
+        try:
+            hash_b = bytes.fromhex(direc + file)
+        except ValueError:
+            # temporary or lock file left by crashed process
+            continue
+        if hash_b not in unused:
+            objects.append((hash_b, ('.lgit/objects/%s/%s' % (direc, file),)))
+    return objects
+
+
+def iter_loose_objects(unused=()):
+    '''
+    Task: yield hash and location of loose objects sorted by hash
+          one directory of objects is read at a time
+    '''
+    for direc in sorted(entry.name for entry in iter_object_direcs()):
+        yield from get_loose_direc(direc, unused)
+
+
+def get_packed_objects(pack):
+    '''
+    Task: yield hash, offset, length of all objects in pack
+    '''
+    count, body = load_index(pack)
+    for i in range(count):
+        yield INDEX_ENTRY.unpack_from(body,
+                                      HEADER.size + i * INDEX_ENTRY.size)
+
+
+def iter_pack_locations(pack):
+    for hash_b, offset, length in get_packed_objects(pack):
+        yield hash_b, (pack, offset, length)
+
+
+def iter_all_objects(packs, unused=()):
+    '''
+    Task: yield hash and location of loose objects and objects in packs
+          sorted by hash, they are merged from loose objects of each
+          directory and indexes of packs are already sorted
+        + Object is stored in many places is yielded one time,
+          loose object is used first
+        + Object in unused is left out
+    '''
+    last = None
+    objects = [iter_loose_objects(unused)]
+    objects.extend(iter_pack_locations(pack) for pack in packs)
+    for hash_b, location in merge(*objects, key=itemgetter(0)):
+        if hash_b == last or hash_b in unused:
+            continue
+        last = hash_b
+        yield hash_b, location
+
+
+def find_location(hash_b, packs, unused=()):
+    '''
+    Task: return location of object as loose object or in packs
+          None if object isn't found or it is in unused
+    '''
+    if hash_b in unused:
+        return None
+    path = get_path_object(hash_b.hex())
+    if os.path.exists(path):
+        return (path,)
+    for pack in packs:
+        location = find_in_pack(pack, hash_b)
+        if location:
+            return (pack,) + location
+    return None
+
+
+def repack(versions=(), max_depth=MAX_DEPTH, unused=()):
+    '''
+    Task: Pack all of loose objects and objects of old packs into one pack
+        + Each version of path is stored as delta from previous version
+          when delta is smaller than full object
+        + Object of large file is kept as list of chunks, its chunks
+          are packed as other objects
+        + Delta chain is not longer than max depth
+        + Objects and entries of index are streamed so memory used
+          don't grow with number of objects: objects of history are
+          written first, their entries are sorted in temporary files,
+          then other objects are merged with them by hash
+        + Write pack and index into temporary files then rename them
+        + Remove old packs and loose objects are packed
+    :param versions: path and hash of each version from oldest to newest
+    :param unused: hash of objects are left out of new pack, they are
+                   removed with old packs or stay as loose objects
+    :return: number of objects packed
+    '''
+    old_packs = get_packs()
+    is_loose = next(iter_loose_objects(unused), None) is not None
+    is_left_out = bool(unused) and any(
+        hash_b in unused for pack in old_packs
+        for hash_b, _, _ in get_packed_objects(pack))
+    if not is_loose and len(old_packs) < 2 and not is_left_out:
+        return 0
+    count = sum(1 for _ in iter_all_objects(old_packs, unused))
+
+    os.makedirs(PACK_DIREC, exist_ok=True)
+    # temporary files of entries of index sorted by hash
+    runs = []
+    checksum = sha1()
+    fd, path_tmp = make_temp_file(PACK_DIREC, 'tmp_pack_')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pack_f = PackWriter(f, checksum)
+            pack_f.write(HEADER.pack(PACK_MAGIC, PACK_VERSION, count))
+            write_history(pack_f, runs, versions, old_packs, unused,
+                          max_depth, count)
+            # other objects are written by order of hash
+            # so their entries are already sorted
+            run = tempfile.TemporaryFile(dir=PACK_DIREC)
+            runs.append(run)
+            written = merge(*[iter_run(run) for run in runs[:-1]])
+            entry = next(written, None)
+            for hash_b, location in iter_all_objects(old_packs, unused):
+                while entry is not None and entry[:20] < hash_b:
+                    entry = next(written, None)
+                if entry is not None and entry[:20] == hash_b:
+                    continue
+                run.write(pack_f.add(hash_b, get_data_packed(location)))
+            if pack_f.number != count:
+                raise ValueError('repack write %d objects of %d' %
+                                 (pack_f.number, count))
+        pack = 'pack-%s' % (checksum.hexdigest())
+        os.replace(path_tmp, '%s/%s.pack' % (PACK_DIREC, pack))
+        sync_later('%s/%s.pack' % (PACK_DIREC, pack))
+        write_index(pack, count, merge(*[iter_run(run) for run in runs]))
+    except BaseException:
+        if os.path.exists(path_tmp):
+            os.remove(path_tmp)
+        raise
+    finally:
+        for run in runs:
+            run.close()
+    # new pack must be on disk before objects in it are removed
+    sync_files()
+
+    # objects are in new pack then remove old packs and loose objects
+    for old in old_packs:
+        if old != pack:
+            close_index(old)
+            os.remove('%s/%s.idx' % (PACK_DIREC, old))
+            os.remove('%s/%s.pack' % (PACK_DIREC, old))
+    for direc in sorted(entry.name for entry in iter_object_direcs()):
+        objects = get_loose_direc(direc, unused)
+        for _, (path,) in objects:
+            os.remove(path)
+        # each directory is checked one time after its objects are removed
+        if objects and not os.listdir('.lgit/objects/%s' % (direc)):
+            os.rmdir('.lgit/objects/%s' % (direc))
+    return count
+
+
+class PackWriter:
+    '''
+    Task: write objects into pack file one by one
+        + Count number of objects and offset of next object
+        + Update checksum of pack by all of data written
+    Example:
+        pack_f = PackWriter(f, sha1())
+        entry = pack_f.add(hash_b, data)
+    '''
+
+    def __init__(self, f, checksum):
+        self.f = f
+        self.checksum = checksum
+        self.offset = 0
+        self.number = 0
+
+    def write(self, data):
+        self.f.write(data)
+        self.checksum.update(data)
+        self.offset = self.offset + len(data)
+
+    def add(self, hash_b, data):
+        '''
+        Task: write data of object, return its entry of index
+        '''
+        entry = INDEX_ENTRY.pack(hash_b, self.offset, len(data))
+        self.write(data)
+        self.number = self.number + 1
+        return entry
+
+
+def write_history(pack_f, runs, versions, packs, unused, max_depth, count):
+    '''
+    Task: write objects of history into pack by order of versions
+        + Base of object is previous version of same path
+        + Object have base only one time when it is written first
+          so there is no cycle of deltas, objects are written is kept
+          in bloom filter, object found by mistake is written later
+          without delta
+        + Entries of objects are sorted in temporary files of runs
+    :param count: number of objects can be packed, size of bloom filter
+    '''
+    written = BloomFilter(count)
+    # path is key, value is hash, location and depth of last version
+    last_version = {}
+    contents = OrderedDict()
+    entries = []
+    for path, hash_f in versions:
+        try:
+            hash_b = bytes.fromhex(hash_f)
+        except ValueError:
+            continue
+        last = last_version.get(path)
+        if last is not None and last[0] == hash_b:
+            continue
+        if hash_b in written:
+            # depth of object isn't kept, don't use it as base
+            last_version[path] = (hash_b, None, max_depth)
+            continue
+        location = find_location(hash_b, packs, unused)
+        if location is None:
+            continue
+        data = None
+        depth = 0
+        if last is not None and last[2] < max_depth:
+            data = get_data_delta(hash_b, location, last[0], last[1],
+                                  contents)
+            depth = last[2] + 1
+        if data is None:
+            data = get_data_packed(location)
+            depth = 0
+        entries.append(pack_f.add(hash_b, data))
+        written.add(hash_b)
+        last_version[path] = (hash_b, location, depth)
+        if len(entries) == RUN_SIZE:
+            runs.append(write_run(entries))
+            entries = []
+    if entries:
+        runs.append(write_run(entries))
+
+
+def write_run(entries):
+    '''
+    Task: return temporary file of entries of index sorted by hash
+    '''
+    run = tempfile.TemporaryFile(dir=PACK_DIREC)
+    run.writelines(sorted(entries))
+    return run
+
+
+def iter_run(run):
+    '''
+    Task: yield entries of index in temporary file part by part
+    '''
+    run.flush()
+    run.seek(0)
+    data = run.read(INDEX_ENTRY.size * 1024)
+    while data:
+        for i in range(0, len(data), INDEX_ENTRY.size):
+            yield data[i:i + INDEX_ENTRY.size]
+        data = run.read(INDEX_ENTRY.size * 1024)
+
+
+def get_data_delta(hash_b, location, base, location_base, contents):
+    '''
+    Task: return data of object in pack format as delta from base
+          None if delta is not smaller than full object
+          or object or base is stored by chunks
+    '''
+    if is_chunks(location) or is_chunks(location_base):
+        return None
+    content = get_content(hash_b, location, contents)
+    delta = zlib.compress(make_delta(
+        get_content(base, location_base, contents), content))
+    if len(delta) + 20 >= len(zlib.compress(content)):
+        return None
+    return OBJ_DELTA + base + delta
+
+
+def get_content(hash_b, location, contents):
+    '''
+    Task: return content of object, keep some last objects in memory
+          because next version often use it as base
+    '''
+    if hash_b in contents:
+        contents.move_to_end(hash_b)
+    else:
+        if len(location) == 3:
+            contents[hash_b] = read_packed_object(*location)
+        else:
+            contents[hash_b] = read_loose_object(location[0])
+        if len(contents) > CACHE_SIZE:
+            contents.popitem(last=False)
+    return contents[hash_b]
+
+
+def is_chunks(location):
+    '''
+    Task: return True if object at location is stored by chunks
+    '''
+    if len(location) == 3:
+        return read_packed(location[0], location[1], 1) == OBJ_CHUNKS
+    with open(location[0], 'rb') as f:
+        return f.read(len(CHUNKS_MAGIC)) == CHUNKS_MAGIC
+
+
+def get_chunks(hash_f):
+    '''
+    Task: return list hash of chunks of object stored by chunks
+          empty list if object isn't stored by chunks or isn't found
+    '''
+    path = get_path_object(hash_f)
+    location = (path,) if os.path.exists(path) else find_object(hash_f)
+    if not location or not is_chunks(location):
+        return []
+    if len(location) == 3:
+        data = read_packed(*location)[1:]
+    else:
+        with open(path, 'rb') as f:
+            data = f.read()[len(CHUNKS_MAGIC):]
+    return [line.split()[0]
+            for line in zlib.decompress(data).decode().splitlines()]
+
+
+def remove_loose_objects(hashes):
+    '''
+    Task: remove loose objects of hashes and their empty directory
+    :return: number of objects and bytes are removed
+    '''
+    number = size = 0
+    for hash_f in hashes:
+        path = get_path_object(hash_f)
+        if os.path.exists(path):
+            size = size + os.path.getsize(path)
+            os.remove(path)
+            # only remove directory of object, not objects directory
+            if not os.listdir(os.path.dirname(path)):
+                os.rmdir(os.path.dirname(path))
+            number = number + 1
+    return number, size
+
+
+def unpack_object(hash_b, location):
+    '''
+    Task: write object in pack as loose object have modified time of pack
+          so it is as old as pack when it is checked again
+    '''
+    data = get_data_packed(location)
+    if data[:1] == OBJ_CHUNKS:
+        data = CHUNKS_MAGIC + data[1:]
+    else:
+        data = data[1:]
+    path = get_path_object(hash_b.hex())
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_file_atomic([data], path, mode='wb')
+    mtime = os.path.getmtime('%s/%s.pack' % (PACK_DIREC, location[0]))
+    os.utime(path, (mtime, mtime))
+
+
+def get_data_packed(location):
+    '''
+    Task: return data of object in pack format from location of object
+    '''
+    if len(location) == 3:
+        data = read_packed(*location)
+        if data[:1] in (OBJ_FULL, OBJ_CHUNKS):
+            return data
+        return OBJ_FULL + zlib.compress(read_packed_object(*location))
+    with open(location[0], 'rb') as f:
+        data = f.read()
+    if data[:4] == CHUNKS_MAGIC:
+        return OBJ_CHUNKS + data[4:]
+    return OBJ_FULL + data
+
+
+def write_index(pack, count, entries):
+    '''
+    Task: write index of pack from entries sorted by hash
+          entries are written one by one with sha1 of all before them
+    '''
+    path = '%s/%s.idx' % (PACK_DIREC, pack)
+    write_file_atomic(iter_index_data(count, entries), path, mode='wb')
+
+
+def iter_index_data(count, entries):
+    checksum = sha1()
+    data = HEADER.pack(INDEX_MAGIC, PACK_VERSION, count)
+    checksum.update(data)
+    yield data
+    for entry in entries:
+        checksum.update(entry)
+        yield entry
+    yield checksum.digest()
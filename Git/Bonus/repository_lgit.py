@@ -0,0 +1,106 @@
+import os
+import sys
+from io import StringIO
+from contextlib import contextmanager, redirect_stdout, redirect_stderr
+import git_bonus
+import graph_lgit
+import get_data_lgit as lgit_g
+
+
+class Repository:
+    '''
+    Task: Open lgit repository one time then run many commands on it
+        + Files of lgit directory and commit graph are kept in memory
+          between commands, they are read again only when changed
+        + Each command is run from top of repository or cwd passed
+    Example:
+        repo = Repository('path/of/repository')
+        repo.add('file')
+        print(repo.status())
+    '''
+
+    def __init__(self, path='.'):
+        self.root = find_root(path)
+        if self.root is None:
+            raise FileNotFoundError('not a lgit repository: %s' % (path))
+
+    def run(self, *args, cwd=None):
+        '''
+        Task: run lgit command with arguments like command line
+        :param cwd: directory inside repository to run command from
+        :return: output of command
+        '''
+        old_cwd = os.getcwd()
+        old_argv = list(sys.argv)
+        output = StringIO()
+        try:
+            os.chdir(cwd or self.root)
+            # argv is shared with args_lgit then change it in place
+            sys.argv[:] = ['lgit'] + [str(arg) for arg in args]
+            graph_lgit.refresh_graph()
+            with redirect_stdout(output), redirect_stderr(output):
+                try:
+                    git_bonus.run_command()
+                except SystemExit:
+                    pass
+        finally:
+            sys.argv[:] = old_argv
+            os.chdir(old_cwd)
+        return output.getvalue()
+
+    def add(self, *files):
+        return self.run('add', *files)
+
+    def status(self):
+        return self.run('status')
+
+    def commit(self, message):
+        return self.run('commit', '-m', message)
+
+    def get_index(self):
+        '''
+        Task: return dictionary path of tracked file is key,
+              hash current, hash add, hash commit is value
+        '''
+        with self.inside():
+            return lgit_g.get_hash_index()
+
+    def get_branch(self):
+        with self.inside():
+            return lgit_g.get_branch_now()
+
+    def get_commits(self, branch=''):
+        '''
+        Task: return list commits of branch from newest to oldest
+        '''
+        with self.inside():
+            graph_lgit.refresh_graph()
+            commit = lgit_g.get_commit_branch(branch)
+            return list(graph_lgit.iter_commits(commit))
+
+    @contextmanager
+    def inside(self):
+        '''
+        Task: change to top of repository then change back
+        '''
+        old_cwd = os.getcwd()
+        os.chdir(self.root)
+        try:
+            yield
+        finally:
+            os.chdir(old_cwd)
+
+
+def find_root(path):
+    '''
+    Task: return top directory of lgit repository have path inside it
+          None if path isn't inside lgit repository
+    '''
+    direc = os.path.abspath(path)
+    while True:
+        if os.path.isdir(os.path.join(direc, '.lgit')):
+            return direc
+        parent = os.path.dirname(direc)
+        if parent == direc:
+            return None
+        direc = parent
@@ -1,10 +1,13 @@
-from utils import read_file, write_file, hash_sha1
+import os
+from time import time_ns
+from utils import read_file, write_file_atomic, hash_sha1
+from utils import map_files, RACY_WINDOW_NS
+from utils import remove_empty_dirs
 import get_data_lgit as lgit_g
 from format_data_lgit import format_index, format_time
-from git_bonus import os
 
 
-def update_index(files_update, mode):
+def update_index(files_update, mode, files_hash=None, time_write=None):
     '''
     Task: Update information of tracked file or untracked file in index file
         + With add command:
@@ -14,53 +17,161 @@ def update_index(files_update, mode):
             - Update hash current and timestamp of file in index file
         + With commit command:
             - Update hash commit of file in index file
+    :param files_hash: hash of files already hashed when stored objects
+    :param time_write: time before files are hashed, file modified after
+                       it can be changed while hashing, don't cache its stat
     '''
-    data_index = read_file('.lgit/index')
+    lines_index = read_file('.lgit/index')
+    data_index = list(lines_index)
+    entries = lgit_g.read_index()
     location = lgit_g.get_pos_track(files_update)
+    if time_write is None:
+        time_write = time_ns()
+    # commit command then ignore about file doesn't exist
+    # or haven't permission to read else skip this file
+    if mode != 'commit':
+        files_update = [file for file in files_update
+                        if os.path.exists(file) and os.access(file, os.R_OK)]
+        # add and status command hash all of files in pool of threads
+        # status command only hash files have changed time since index
+        if files_hash is None:
+            files_hash = {}
+            files_changed = files_update
+            if mode == 'status':
+                files_changed = get_files_changed(files_update, data_index,
+                                                  entries, location,
+                                                  files_hash)
+            files_hash.update(zip(files_changed,
+                                  map_files(hash_sha1, files_changed)))
     for file in files_update:
-        # commit command then ignore about file doesn't exist
-        # or haven't permission to read else skip this file
         # if there is valid file then get location file
-        if mode != 'commit' and (not os.path.exists(file) or
-                                 not os.access(file, os.R_OK)):
-            continue
         line = location.get(file, -1)
 
         # add command need hash sha1 file
         # hash add equal hash file
         # hash commit get from index file or empty
         if mode == 'add':
-            h_current = hash_sha1(file)
+            h_current = files_hash[file]
             h_add = h_current
             if line != -1:
-                _, _, _, h_commit, _ = lgit_g.get_info_index(data_index[line])
+                _, _, _, h_commit, _ = entries[line]
 
         # commit command only read inside index file
         # read hash current, hash add
         # then now hash commit equal hash add
         elif mode == 'commit':
-            _, h_current, h_add, _, _ = lgit_g.get_info_index(data_index[line])
+            _, h_current, h_add, _, _ = entries[line]
             h_commit = h_add
 
         # status command update timestamp and hash file now
         # get hash sha1 file then read index file get hash add and commit
         elif mode == 'status':
-            h_current = hash_sha1(file)
-            _, _, h_add, h_commit, _ = lgit_g.get_info_index(data_index[line])
+            h_current = files_hash[file]
+            _, _, h_add, h_commit, _ = entries[line]
 
+        stat_f = get_stat_cache(file, time_write)
         if line != -1:
             data_index[line] = format_index(format_time(
-                os.path.getmtime(file)), h_current, h_add, h_commit, file)
+                os.path.getmtime(file)), h_current, h_add, h_commit, file,
+                stat_f)
 
         # when add command if file not in index file then append it into list
         else:
             data_index.append(format_index(format_time(
-                os.path.getmtime(file)), h_current, h_add, '', file))
+                os.path.getmtime(file)), h_current, h_add, '', file, stat_f))
 
-    # hash information changes is diffent with origin index file
+    # information changes is diffent with origin index file
     # if different then update information changes into index file
-    if hash_sha1('.lgit/index') != hash_sha1(data_index, mode='list'):
-        write_file(data_index, file='.lgit/index')
+    if data_index != lines_index:
+        write_file_atomic(data_index, file='.lgit/index')
+
+
+def get_files_changed(files, data_index, entries, location, files_hash):
+    '''
+    Task: return list of files need hash again
+        + File have same mtime_ns, ctime_ns, size and inode with stat
+          cache in index file then its content isn't changed,
+          get hash current from index file
+        + File modified after index file written is racy
+          its next change can have same stat so hash it again
+    :param entries: fields of lines in index file from read_index
+    :param files_hash: dictionary is filled hash of files not changed
+    '''
+    mtime_index = os.stat('.lgit/index').st_mtime_ns
+    files_changed = []
+    for file in files:
+        line = location.get(file, -1)
+        if line != -1:
+            _, h_current, _, _, _ = entries[line]
+            stat_index = lgit_g.get_stat_index(data_index[line])
+            if (stat_index != lgit_g.STAT_EMPTY and
+                    stat_index[0] < mtime_index and
+                    stat_index == get_stat_file(file)):
+                files_hash[file] = h_current
+                continue
+        files_changed.append(file)
+    return files_changed
+
+
+def get_stat_file(file):
+    '''
+    Task: return mtime_ns, ctime_ns, size, inode of file
+    '''
+    info = os.stat(file)
+    return info.st_mtime_ns, info.st_ctime_ns, info.st_size, info.st_ino
+
+
+def get_stat_cache(file, time_write):
+    '''
+    Task: return stat of file to store in index file
+          file modified in racy window before index written can
+          change again in same mtime, don't cache its stat
+    '''
+    stat_f = get_stat_file(file)
+    if stat_f[0] >= time_write - RACY_WINDOW_NS:
+        return lgit_g.STAT_EMPTY
+    return stat_f
+
+
+def update_files_diff(files_diff):
+    '''
+    Task: Change only files are different between 2 commits
+        + File have new hash then write content of object into file
+        + File haven't new hash then remove it and its empty directories
+    :param files_diff: a dictionary key is file, value is old hash
+                       and new hash of file
+    '''
+    for file, (_, hash_new) in files_diff.items():
+        if os.path.exists(file) and (not hash_new or
+                                     not os.access(file, os.W_OK)):
+            os.remove(file)
+        if hash_new:
+            update_content_file(file, hash_new)
+        else:
+            remove_empty_dirs(file)
+
+
+def update_index_diff(files_diff):
+    '''
+    Task: Update lines of index file of files changed by update_files_diff
+        + File have new hash then all of its hash is new hash
+        + File haven't new hash then remove its line
+    '''
+    data_index = read_file('.lgit/index')
+    location = lgit_g.get_pos_track(files_diff.keys())
+    time_write = time_ns()
+    for file, (_, hash_new) in files_diff.items():
+        line = location.get(file, -1)
+        data = ''
+        if hash_new:
+            data = format_index(format_time(os.path.getmtime(file)),
+                                hash_new, hash_new, hash_new, file,
+                                get_stat_cache(file, time_write))
+        if line != -1:
+            data_index[line] = data
+        else:
+            data_index.append(data)
+    write_file_atomic(data_index, file='.lgit/index')
 
 
 def update_files_commit(files_hash):
@@ -78,18 +189,23 @@ def update_files_commit(files_hash):
     for file in files_hash.keys():
         if os.path.exists(file) and not os.access(file, os.W_OK):
             os.remove(file)
-        if not os.path.exists(file) or files_hash[file] != hash_sha1(file):
+    # hash all of files exist in pool of threads before compare
+    files_exist = [file for file in files_hash.keys() if os.path.exists(file)]
+    files_now = dict(zip(files_exist, map_files(hash_sha1, files_exist)))
+    for file in files_hash.keys():
+        if files_hash[file] != files_now.get(file):
             update_content_file(file, files_hash[file])
         files_update.append(file)
     return files_update
 
 
 def update_content_file(file, hash_file):
-    content = lgit_g.get_data_object(hash_file)
+    # content is written part by part or copied by kernel
+    # so large file isn't kept all in memory
     head, _ = os.path.split(file)
     if head and not os.path.exists(head):
         os.makedirs(head)
-    write_file(content, file, mode='wb')
+    lgit_g.write_data_object(hash_file, file)
 
 
 def update_commit_branch(commit):
@@ -99,7 +215,7 @@ def update_commit_branch(commit):
     :return:
     '''
     branch = lgit_g.get_branch_now()
-    write_file(['%s\n' % (commit)], '.lgit/refs/heads/%s' % (branch))
+    write_file_atomic(['%s\n' % (commit)], '.lgit/refs/heads/%s' % (branch))
 
 
 def update_branch_now(branch):
@@ -108,15 +224,4 @@ def update_branch_now(branch):
     :param branch: branch is switch
     :return: nothing
     '''
-    write_file(['ref: refs/heads/%s\n' % (branch)], '.lgit/HEAD')
-
-
-def update_stash():
-    files = os.listdir('.lgit/refs/stash')
-    if files:
-        last_stash = sorted(files, key=str)[-1]
-        files_hash = lgit_g.get_files_hash(last_stash, mode='stash')
-        update_files_commit(files_hash)
-        print('Restore working directory')
-    else:
-        print("Nothing to unstaged at all")
+    write_file_atomic(['ref: refs/heads/%s\n' % (branch)], '.lgit/HEAD')
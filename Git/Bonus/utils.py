@@ -1,15 +1,124 @@
 import os
+import sys
+import json
+import importlib.util
+from contextlib import contextmanager
 from sys import exit as exit_program
+from time import time_ns
 from hashlib import sha1
+try:
+    import fcntl
+except ImportError:
+    # system haven't flock then lgit processes aren't serialized
+    fcntl = None
+
+# size of buffer read file when hash or copy file
+BUFFER_SIZE = 1024 * 1024
+# number of threads hash files, None is depend on number of processors
+jobs = None
+# untracked cache: directory is key, value is its mtime_ns,
+# name of files and name of subdirectories
+UNTRACKED_CACHE = '.lgit/untracked'
+# directory modified in this window before cache written is racy
+# its mtime can be same with next change so don't cache it
+RACY_WINDOW_NS = 10 ** 9
+# lock of repository is held by one lgit process at a time
+LOCK_FILE = '.lgit/lock'
+_lock = None
+# files written in this command and not synced to disk yet
+_written = set()
+# directories have files renamed in this command, synced at the end
+_direcs = set()
+# files written by write_file_atomic in batch, renamed together at the
+# end of batch: file is key, its lock file is value, None if no batch
+_renames = None
+# lock of repository is shared, command only read repository
+_shared = False
+# content of files in lgit directory read before and their stat
+# so long running process (Repository, daemon) read them again
+# only when they are changed
+_files = {}
+
+
+def lazy_import(name):
+    '''
+    Task: return module is only loaded when it is used first time
+          so each command only load modules it need
+    '''
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+futures = lazy_import('concurrent.futures')
 
 
 def hash_sha1(file, mode='file'):
     '''
     Task: return hash sha1 of file passed
     '''
+    hash_f = sha1()
     if mode == 'file':
-        return sha1(b''.join(read_file(file, mode='rb'))).hexdigest()
-    return sha1(b''.join([str.encode(f) for f in file])).hexdigest()
+        for chunk in read_chunks(file):
+            hash_f.update(chunk)
+    else:
+        for line in file:
+            hash_f.update(str.encode(line))
+    return hash_f.hexdigest()
+
+
+def set_jobs(number):
+    global jobs
+    jobs = number
+
+
+def map_files(task, files):
+    '''
+    Task: run task on each file in pool of threads
+          return list result in same order with files
+    '''
+    files = list(files)
+    if jobs == 1 or len(files) < 2:
+        return [task(file) for file in files]
+    with futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(task, files))
+
+
+def read_chunks(file):
+    '''
+    Task: yield content of file chunk by chunk in one reused buffer
+          so memory don't grow with size of file
+    '''
+    with open(file, 'rb', buffering=0) as f:
+        size_f = os.fstat(f.fileno()).st_size
+        buffer = bytearray(min(BUFFER_SIZE, size_f) or 1)
+        view = memoryview(buffer)
+        size = f.readinto(buffer)
+        while size:
+            yield view[:size]
+            size = f.readinto(buffer)
+
+
+def make_temp_file(direc, prefix):
+    '''
+    Task: create unique temporary file for writing like mkstemp
+          but with mode 666 less umask like files created by open
+          so objects of repository shared by group keep its permission
+    :return: file descriptor and path of file
+    '''
+    while True:
+        path = os.path.join(direc, prefix + os.urandom(8).hex())
+        try:
+            return os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY,
+                           0o666), path
+        except FileExistsError:
+            continue
 
 
 def split_dir_file(hash_file):
@@ -27,8 +136,31 @@ def remove_empty_dirs(path):
 
 
 def read_file(file, mode='r'):
-    with open(file, mode) as f:
-        return f.readlines()
+    '''
+    Task: return lines of file
+        + File in lgit directory is kept in memory with its stat
+          it is read again when its stat is changed
+        + File modified in racy window isn't kept, its next change
+          can have same stat
+    '''
+    # file written in batch isn't renamed yet, read its lock file
+    if _renames and file in _renames:
+        file = _renames[file]
+    if mode != 'r' or not file.startswith('.lgit/') or file.endswith('.lock'):
+        with open(file, mode) as f:
+            return f.readlines()
+    path = os.path.abspath(file)
+    info = os.stat(path)
+    stat_f = (info.st_mtime_ns, info.st_ctime_ns, info.st_size, info.st_ino)
+    if path in _files and _files[path][0] == stat_f:
+        return list(_files[path][1])
+    with open(path) as f:
+        lines = f.readlines()
+    if info.st_mtime_ns < time_ns() - RACY_WINDOW_NS:
+        _files[path] = (stat_f, lines)
+    else:
+        _files.pop(path, None)
+    return list(lines)
 
 
 def write_file(data, file, mode='w'):
@@ -42,32 +174,220 @@ def write_file(data, file, mode='w'):
         f.writelines(data)
 
 
+def write_file_atomic(data, file, mode='w'):
+    '''
+    Task: replace file by new content, other lgit processes and crash
+          see old content or new content but never a part of it
+        + Write content into lock file next to file then rename it
+        + Lock file left by crashed process is overwritten because
+          only process hold lock of repository write lock files
+        + Lock file and files written before it (objects) are synced
+          to disk before rename, so after crash file never point to
+          data isn't on disk
+        + In batch_writes, rename is done at the end of batch
+    '''
+    lock = file + '.lock'
+    try:
+        with open(lock, mode) as f:
+            f.writelines(data)
+        sync_later(lock)
+        if _renames is not None:
+            _renames[file] = lock
+            return
+        flush_written()
+        os.replace(lock, file)
+    except BaseException:
+        _written.discard(lock)
+        if os.path.exists(lock):
+            os.remove(lock)
+        raise
+    _direcs.add(os.path.dirname(file) or '.')
+
+
+@contextmanager
+def batch_writes():
+    '''
+    Task: files written by write_file_atomic inside it are replaced
+          together at the end of it, so each file is synced one time
+        + Write all of lock files
+        + Sync each of them and files written before (objects) one time
+        + Rename all of lock files
+        + Their directories are synced one time at the end of command
+    Example:
+        with batch_writes():
+            write_file_atomic(data_index, '.lgit/index')
+            write_file_atomic(data_ref, '.lgit/refs/heads/master')
+    '''
+    global _renames
+    if _renames is not None:
+        yield
+        return
+    _renames = {}
+    try:
+        yield
+        flush_written()
+        for file, lock in _renames.items():
+            os.replace(lock, file)
+            _direcs.add(os.path.dirname(file) or '.')
+    finally:
+        for lock in _renames.values():
+            _written.discard(lock)
+            if os.path.exists(lock):
+                os.remove(lock)
+        _renames = None
+
+
+def sync_later(file):
+    _written.add(file)
+
+
+def flush_written():
+    '''
+    Task: sync data of files written and not synced yet to disk
+        + Only these files are synced, each of them one time, in pool
+          of threads so file system write them together
+        + Their directories are synced at the end of command
+    '''
+    files = [file for file in _written if os.path.exists(file)]
+    _written.clear()
+    map_files(fsync_path, files)
+    _direcs.update(os.path.dirname(file) or '.' for file in files)
+
+
+def sync_files():
+    '''
+    Task: sync files written in this command and their directories
+          to disk at the end of command
+    '''
+    flush_written()
+    map_files(fsync_path, [direc for direc in _direcs
+                           if os.path.exists(direc)])
+    _direcs.clear()
+
+
+def fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def lock_repo(shared=False):
+    '''
+    Task: wait until other lgit processes of repository finish
+          then hold lock of repository until this process exit
+    :param shared: command only read repository then it can run
+                   together with other commands only read
+    '''
+    global _lock, _shared
+    if fcntl is None or _lock is not None:
+        return
+    _lock = open(LOCK_FILE, 'a')
+    fcntl.flock(_lock.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+    _shared = shared
+
+
+def is_lock_shared():
+    '''
+    Task: return True if command hold shared lock of repository
+          then it must not write files of lgit directory, other
+          commands hold shared lock use same lock files
+    '''
+    return _lock is not None and _shared
+
+
+def unlock_repo():
+    '''
+    Task: let other lgit processes use repository
+    '''
+    global _lock, _shared
+    if _lock is not None:
+        _lock.close()
+        _lock = None
+        _shared = False
+
+
 def get_files_direc(direc='.', mode=''):
     '''
     Task: return list file in subdirectory passed and directory passed
+        + Directory have same mtime with last time scan then reuse its
+          files and subdirectories in untracked cache, only stat it
+        + Else list directory again and update untracked cache
     '''
+    # top of lgit directory can be passed as absolute path
+    # path of files are always relative with lgit directory
+    direc = os.path.relpath(direc)
+    cache = read_untracked_cache()
+    new_cache = {}
+    time_write = time_ns()
     dir_direc = [direc]
     file_direc = []
     # find all path of file in src
     while dir_direc:
         # take directory from src
+        sub_direc = dir_direc.pop()
         try:
-            direc = dir_direc.pop()
-            entry_direc = os.scandir(direc)
-            for e in entry_direc:
-                # store file in data_dir
-                if e.is_file():
-                    file_direc.append(rm_head_lgit(os.path.abspath(e.path)))
-                # store directory in data_dir
-                if e.is_dir() and ".lgit" not in e.path:
-                    dir_direc.append(e.path)
+            mtime = os.stat(sub_direc).st_mtime_ns
+            if sub_direc in cache and cache[sub_direc][0] == mtime:
+                _, files, subdirs = cache[sub_direc]
+            else:
+                files, subdirs = scan_direc(sub_direc)
         except PermissionError:
             if mode == 'add':
                 print("warning: could not open directory '%s/%s/': "
-                      "Permission denied " % (os.getcwd(), direc))
+                      "Permission denied " % (os.getcwd(), sub_direc))
                 exit_program()
+            continue
+        # racy directory can change again in same mtime, don't cache it
+        if mtime < time_write - RACY_WINDOW_NS:
+            new_cache[sub_direc] = [mtime, files, subdirs]
+        else:
+            new_cache[sub_direc] = None
+        # path of file is relative with lgit directory
+        head = '' if sub_direc == '.' else sub_direc + '/'
+        file_direc.extend(head + file for file in files)
+        dir_direc.extend(head + sub for sub in subdirs)
+    update_untracked_cache(cache, new_cache, full=(direc == '.'))
     return file_direc
 
 
+def scan_direc(direc):
+    '''
+    Task: return name of files and name of subdirectories of directory
+    '''
+    files = []
+    subdirs = []
+    with os.scandir(direc) as entry_direc:
+        for e in entry_direc:
+            if e.is_file():
+                files.append(e.name)
+            elif e.is_dir() and e.name != '.lgit':
+                subdirs.append(e.name)
+    return files, subdirs
+
+
+def read_untracked_cache():
+    try:
+        with open(UNTRACKED_CACHE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_untracked_cache(cache, new_cache, full):
+    '''
+    Task: write untracked cache if there is changes
+        + Scan from top of lgit directory then replace all of cache
+        + Else only update directories scanned
+    '''
+    data = {} if full else dict(cache)
+    data.update(new_cache)
+    # remove racy directories
+    data = {direc: info for direc, info in data.items() if info}
+    if data != cache and not is_lock_shared():
+        write_file_atomic([json.dumps(data)], UNTRACKED_CACHE)
+
+
 def rm_head_lgit(path):
     return path.replace(os.getcwd() + "/", '')
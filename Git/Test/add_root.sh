@@ -0,0 +1,31 @@
+#!/bin/bash
+# run in Deploy directory made by setup.sh
+# add . at top of repository store path relative with repository
+# so file added before by its name isn't tracked two times
+check() {
+    if [ "$($1 ls-files)" != "$(printf 'file1\nsub/file2')" ]; then
+        $1 ls-files
+        echo "FAIL: $1 add . store wrong paths"
+    elif $1 status | grep -q "Untracked files"; then
+        echo "FAIL: $1 status show tracked files as untracked"
+    else
+        echo "PASS: $1"
+    fi
+}
+deploy=$(pwd)
+for lgit in "python3 $deploy/../../lgit.py" "$deploy/git_bonus.py"; do
+    echo "-----------------INIT----------------"
+    rm -rf repo
+    mkdir repo && cd repo
+    $lgit init
+    echo "Welcome to Intek" > file1
+    mkdir sub
+    echo "Welcome to Hyperspace" > sub/file2
+    echo "------------------ADD----------------"
+    $lgit add file1
+    $lgit add .
+    echo "-----------------CHECK---------------"
+    check "$lgit"
+    cd ..
+done
+rm -rf repo
@@ -0,0 +1,567 @@
+#!/usr/bin/env python3
+import os
+import sys
+import zlib
+import random
+import tracemalloc
+import subprocess
+import shutil
+from argparse import ArgumentParser
+from tempfile import TemporaryDirectory
+from time import perf_counter, time
+from hashlib import sha1
+
+# import lgit.py from directory Git and modules of Bonus
+GIT_DIREC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BONUS_DIREC = os.path.join(GIT_DIREC, 'Bonus')
+sys.path.insert(0, GIT_DIREC)
+sys.path.insert(1, BONUS_DIREC)
+import lgit  # noqa: E402
+import pack_lgit  # noqa: E402
+import chunk_lgit  # noqa: E402
+import gc_lgit  # noqa: E402
+import create_data_lgit  # noqa: E402
+import get_data_lgit  # noqa: E402
+import diff_lgit  # noqa: E402
+import update_data_lgit  # noqa: E402
+from repository_lgit import Repository  # noqa: E402
+
+
+def create_tree(root, number, size, width=100):
+    '''
+    Task: create synthetic tree have number files with size bytes
+          each directory have width files
+    return list path of files relative with root
+    '''
+    files = []
+    for i in range(number):
+        direc = os.path.join(root, 'd%d' % (i // width))
+        if i % width == 0:
+            os.makedirs(direc)
+        path = os.path.join(direc, 'f%d' % (i))
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size))
+        files.append(os.path.relpath(path, root))
+    return files
+
+
+def get_list_jobs(maximum):
+    '''
+    Task: return list number of workers 1, 2, 4 ... to maximum
+    '''
+    list_jobs = []
+    number = 1
+    while number < maximum:
+        list_jobs.append(number)
+        number = number * 2
+    list_jobs.append(maximum)
+    return list_jobs
+
+
+def bench_hash(args):
+    '''
+    Task: show time hash all files of synthetic tree from 1 to N workers
+          hash of all workers must be same with 1 worker
+    '''
+    with TemporaryDirectory() as root:
+        print('Create %d files of %d bytes' % (args.files, args.size))
+        files = create_tree(root, args.files, args.size)
+        os.chdir(root)
+        # read all files one time so every run read from page cache
+        lgit.jobs = 1
+        expected = lgit.map_files(lgit.hash_sha1, files)
+        base = None
+        for jobs in get_list_jobs(args.jobs):
+            lgit.jobs = jobs
+            start = perf_counter()
+            result = lgit.map_files(lgit.hash_sha1, files)
+            run_time = perf_counter() - start
+            base = base or run_time
+            print('jobs %3d: %8.3fs  speedup %5.2fx  %s' %
+                  (jobs, run_time, base / run_time,
+                   'same' if result == expected else 'DIFFERENT'))
+
+
+def run_bonus(*args):
+    subprocess.run([sys.executable, os.path.join(BONUS_DIREC, 'git_bonus.py')]
+                   + list(args), check=True, stdout=subprocess.DEVNULL)
+
+
+def get_size_direc(direc):
+    size = 0
+    for root, _, files in os.walk(direc):
+        for file in files:
+            size = size + os.path.getsize(os.path.join(root, file))
+    return size
+
+
+def change_bytes(content, changes):
+    '''
+    Task: change some bytes or insert some bytes into content
+    '''
+    for _ in range(changes):
+        pos = random.randrange(len(content))
+        if random.random() < 0.5:
+            content[pos:pos + 64] = os.urandom(64)
+        else:
+            content[pos:pos] = os.urandom(64)
+
+
+def create_history(commits, size, changes):
+    '''
+    Task: commit many versions of one file, each version only change
+          some bytes or insert some bytes from previous version
+    '''
+    run_bonus('init')
+    content = bytearray(os.urandom(size))
+    for _ in range(commits):
+        change_bytes(content, changes)
+        with open('data.bin', 'wb') as f:
+            f.write(content)
+        run_bonus('add', 'data.bin')
+        run_bonus('commit', '-m', 'change data')
+
+
+def bench_pack(args):
+    '''
+    Task: show size of pack and time read object with max depth of delta
+    '''
+    with TemporaryDirectory() as root:
+        repo = os.path.join(root, 'repo')
+        os.makedirs(repo)
+        os.chdir(repo)
+        print('Commit %d versions of file %d bytes' % (args.commits,
+                                                       args.size))
+        create_history(args.commits, args.size, args.changes)
+        print('loose objects: %12d bytes' %
+              (get_size_direc('.lgit/objects')))
+        for depth in args.depths:
+            os.chdir(root)
+            shutil.copytree(repo, 'depth_%d' % (depth))
+            os.chdir('depth_%d' % (depth))
+            pack_lgit._indexes.clear()
+            start = perf_counter()
+            pack_lgit.repack(get_data_lgit.get_history_objects(),
+                             max_depth=depth)
+            time_pack = perf_counter() - start
+            hashes = [h.hex() for pack in pack_lgit.get_packs()
+                      for h, _, _ in pack_lgit.get_packed_objects(pack)]
+            times = []
+            for hash_f in hashes:
+                start = perf_counter()
+                get_data_lgit.get_data_object(hash_f)
+                times.append(perf_counter() - start)
+            print('depth %3d: pack %12d bytes  repack %7.2fs  '
+                  'read avg %7.2fms  max %7.2fms' %
+                  (depth, get_size_direc('.lgit/objects/pack'), time_pack,
+                   sum(times) / len(times) * 1000, max(times) * 1000))
+
+
+def bench_checkout(args):
+    '''
+    Task: show time switch between 2 branches only different some files
+    '''
+    with TemporaryDirectory() as root:
+        os.chdir(root)
+        print('Create %d files, change %d files at branch dev' %
+              (args.files, args.changes))
+        files = create_tree(root, args.files, args.size)
+        run_bonus('init')
+        run_bonus('add', '.')
+        run_bonus('commit', '-m', 'first')
+        run_bonus('branch', 'dev')
+        run_bonus('checkout', 'dev')
+        for file in random.sample(files, args.changes):
+            with open(file, 'wb') as f:
+                f.write(os.urandom(args.size))
+            run_bonus('add', file)
+        run_bonus('commit', '-m', 'change files')
+        for branch in ('master', 'dev', 'master'):
+            start = perf_counter()
+            run_bonus('checkout', branch)
+            print('checkout %-6s: %8.3fs' % (branch, perf_counter() - start))
+
+
+def bench_chunk(args):
+    '''
+    Task: show dedup ratio of large file stored by chunks
+          and throughput of add and checkout of it
+    '''
+    with TemporaryDirectory() as root:
+        os.chdir(root)
+        print('Commit %d versions of file %d bytes' % (args.commits,
+                                                       args.size))
+        run_bonus('init')
+        run_bonus('config', '--chunks', 'on')
+        content = bytearray(os.urandom(args.size))
+        logical = time_add = 0
+        for i in range(args.commits):
+            if i:
+                change_bytes(content, args.changes)
+            with open('data.bin', 'wb') as f:
+                f.write(content)
+            logical = logical + len(content)
+            start = perf_counter()
+            run_bonus('add', 'data.bin')
+            time_add = time_add + perf_counter() - start
+            run_bonus('commit', '-m', 'change data')
+            if not i:
+                run_bonus('branch', 'first')
+        stored = get_size_direc('.lgit/objects')
+        print('logical %12d bytes  stored %12d bytes  dedup %6.2fx' %
+              (logical, stored, logical / stored))
+        print('add     : %8.2f MB/s' % (logical / time_add / 10 ** 6))
+        for branch in ('first', 'master'):
+            start = perf_counter()
+            run_bonus('checkout', branch)
+            run_time = perf_counter() - start
+            print('checkout %-6s: %8.3fs  %8.2f MB/s' %
+                  (branch, run_time,
+                   os.path.getsize('data.bin') / run_time / 10 ** 6))
+
+
+def store_object(file, form):
+    '''
+    Task: store file as one loose object by form, return hash of file
+        + compressed: zlib object like lgit add
+        + chunks: list of chunks cut at average size of chunk
+    '''
+    hash_f = get_data_lgit.hash_sha1(file)
+    path = pack_lgit.get_path_object(hash_f)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    chunks = []
+    with open(path, 'wb') as f:
+        compress = zlib.compressobj(1)
+        for data in lgit.read_chunks(file):
+            if form == 'compressed':
+                f.write(compress.compress(data))
+            else:
+                for start in range(0, len(data), chunk_lgit.AVERAGE_SIZE):
+                    chunk = bytes(data[start:start +
+                                       chunk_lgit.AVERAGE_SIZE])
+                    store_chunk(chunk)
+                    chunks.append((sha1(chunk).hexdigest(),
+                                   len(chunk)))
+        if form == 'compressed':
+            f.write(compress.flush())
+        elif form == 'chunks':
+            f.write(pack_lgit.format_list_chunks(chunks))
+    return hash_f
+
+
+def store_chunk(chunk):
+    path = pack_lgit.get_path_object(sha1(chunk).hexdigest())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(zlib.compress(chunk, 1))
+
+
+def measure(task, *args):
+    '''
+    Task: return time and peak memory allocated by python of task
+    '''
+    tracemalloc.start()
+    start = perf_counter()
+    task(*args)
+    run_time = perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return run_time, peak
+
+
+def write_all(file, hash_f):
+    '''
+    Task: read all of object into memory then write it like before
+    '''
+    content = get_data_lgit.get_data_object(hash_f)
+    with open(file, 'wb') as f:
+        f.write(content)
+
+
+def bench_object(args):
+    '''
+    Task: show time and peak memory allocated by python to checkout
+          one large object stored by each form, by update_content_file
+          compared with read all of object into memory then write it
+    '''
+    with TemporaryDirectory() as root:
+        os.chdir(root)
+        run_bonus('init')
+        print('Create file of %d bytes' % (args.size))
+        with open('data.bin', 'wb') as f:
+            for _ in range(0, args.size, lgit.BUFFER_SIZE):
+                f.write(os.urandom(lgit.BUFFER_SIZE))
+            f.truncate(args.size)
+        for form in args.forms:
+            shutil.rmtree('.lgit/objects')
+            os.makedirs('.lgit/objects')
+            pack_lgit._indexes.clear()
+            hash_f = store_object('data.bin', 'chunks' if form == 'chunks'
+                                  else 'compressed')
+            if form == 'packed':
+                pack_lgit.repack()
+            for name, task in (('update_content_file',
+                                update_data_lgit.update_content_file),
+                               ('read all', write_all)):
+                run_time, peak = measure(task, 'out.bin', hash_f)
+                same = get_data_lgit.hash_sha1('out.bin') == hash_f
+                os.remove('out.bin')
+                print('%-10s %-19s: %8.3fs  %8.2f MB/s  peak %10d bytes'
+                      '  %s' % (form, name, run_time,
+                                args.size / run_time / 10 ** 6, peak,
+                                'same' if same else 'DIFFERENT'))
+
+
+def create_objects(number):
+    '''
+    Task: write number of small loose objects, half of them are files
+          of snapshot of a commit, other half are unused and older than
+          grace period
+    '''
+    old = time() - 2 * gc_lgit.GRACE_PERIOD
+    files_hash = {}
+    for i in range(number):
+        data = b'object %d' % (i)
+        hash_f = sha1(data).hexdigest()
+        path = pack_lgit.get_path_object(hash_f)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(zlib.compress(data))
+        if i % 2:
+            os.utime(path, (old, old))
+        else:
+            files_hash['d%d/f%d' % (i // 200, i)] = hash_f
+    with open('.lgit/snapshots/20000101000000', 'w') as f:
+        f.write('tree %s\n' % (create_data_lgit.create_tree(files_hash)))
+
+
+def mark_sweep():
+    marked = gc_lgit.mark_objects()
+    return gc_lgit.sweep_loose_objects(marked,
+                                       time() - gc_lgit.GRACE_PERIOD)
+
+
+def bench_prune(args):
+    '''
+    Task: show time and peak memory allocated by python to mark and
+          sweep loose objects then pack objects are left,
+          half of objects are removed
+    '''
+    for number in args.objects:
+        with TemporaryDirectory() as root:
+            os.chdir(root)
+            run_bonus('init')
+            create_objects(number)
+            time_sweep, peak_sweep = measure(mark_sweep)
+            time_pack, peak_pack = measure(pack_lgit.repack)
+            print('objects %9d: mark and sweep %7.2fs  peak %10d bytes  '
+                  'repack %7.2fs  peak %10d bytes' %
+                  (number, time_sweep, peak_sweep, time_pack, peak_pack))
+
+
+def change_lines(lines, changes):
+    '''
+    Task: return copy of lines with some lines changed, inserted, deleted
+    '''
+    lines = list(lines)
+    for _ in range(changes):
+        pos = random.randrange(len(lines))
+        action = random.randrange(3)
+        if action == 0:
+            lines[pos] = 'changed %d\n' % (random.getrandbits(32))
+        elif action == 1:
+            lines.insert(pos, 'inserted %d\n' % (random.getrandbits(32)))
+        else:
+            del lines[pos]
+    return lines
+
+
+def bench_merge(args):
+    '''
+    Task: show time 3-way merge of file changed at 2 branches
+    '''
+    for number in args.lines:
+        origin = ['line %d %s\n' % (i, os.urandom(16).hex())
+                  for i in range(number)]
+        master = change_lines(origin, args.changes)
+        branch = change_lines(origin, args.changes)
+        start = perf_counter()
+        merge_file = diff_lgit.merge3(origin, master, branch)
+        run_time = perf_counter() - start
+        conflicts = sum(1 for tag, _, _ in merge_file if tag == 'conflict')
+        print('lines %8d: merge %8.3fs  conflicts %d' %
+              (number, run_time, conflicts))
+
+
+def bench_repository(args):
+    '''
+    Task: show time run status many times by command line
+          and by Repository opened one time
+    '''
+    with TemporaryDirectory() as root:
+        os.chdir(root)
+        print('Create %d files, run status %d times' %
+              (args.files, args.runs))
+        create_tree(root, args.files, args.size)
+        run_bonus('init')
+        run_bonus('add', '.')
+        run_bonus('commit', '-m', 'first')
+        start = perf_counter()
+        for _ in range(args.runs):
+            run_bonus('status')
+        time_cli = perf_counter() - start
+        repo = Repository(root)
+        start = perf_counter()
+        for _ in range(args.runs):
+            repo.status()
+        time_repo = perf_counter() - start
+        print('command line: %8.3fs  %7.2fms each' %
+              (time_cli, time_cli / args.runs * 1000))
+        print('Repository  : %8.3fs  %7.2fms each' %
+              (time_repo, time_repo / args.runs * 1000))
+
+
+def get_import_times(*args):
+    '''
+    Task: return dictionary top module is key, microseconds to import it
+          and its submodules is value when run lgit with arguments
+    '''
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime',
+         os.path.join(BONUS_DIREC, 'git_bonus.py')] + list(args),
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[12:].split('|')
+        # module imported by other module have spaces before its name
+        if not name[1:].startswith(' '):
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def bench_startup(args):
+    '''
+    Task: show import time and run time of lgit status
+          fail when import time is bigger than budget
+    '''
+    with TemporaryDirectory() as root:
+        os.chdir(root)
+        create_tree(root, args.files, 1024)
+        run_bonus('init')
+        run_bonus('add', '.')
+        run_bonus('commit', '-m', 'first')
+        totals = []
+        for _ in range(args.runs):
+            times = get_import_times('status')
+            totals.append(sum(times.values()))
+        start = perf_counter()
+        for _ in range(args.runs):
+            run_bonus('status')
+        run_time = (perf_counter() - start) / args.runs
+        import_time = sorted(totals)[len(totals) // 2] / 1000
+        for name in sorted(times, key=times.get, reverse=True)[:10]:
+            print('%-28s %8.2fms' % (name, times[name] / 1000))
+        print('import time: %7.2fms (budget %.2fms)  status: %7.2fms' %
+              (import_time, args.budget, run_time * 1000))
+        if import_time > args.budget:
+            print('FAIL: import time is over budget')
+            sys.exit(1)
+        print('PASS')
+
+
+def main():
+    parser = ArgumentParser(prog='benchmarking',
+                            description='Benchmark of lgit')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    hashing = commands.add_parser('hash', help='scaling of hashing files '
+                                  'from 1 to N workers')
+    hashing.add_argument('--files', type=int, default=100000,
+                         help='number of files in synthetic tree')
+    hashing.add_argument('--size', type=int, default=4096,
+                         help='size of each file in bytes')
+    hashing.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                         help='maximum number of workers')
+    hashing.set_defaults(run=bench_hash)
+    packing = commands.add_parser('pack', help='size of pack and latency '
+                                  'read object with depth of delta chain')
+    packing.add_argument('--commits', type=int, default=100,
+                         help='number of versions of file')
+    packing.add_argument('--size', type=int, default=1024 * 1024,
+                         help='size of file in bytes')
+    packing.add_argument('--changes', type=int, default=4,
+                         help='number of changes between two versions')
+    packing.add_argument('--depths', type=int, nargs='+',
+                         default=[0, 1, 10, 50],
+                         help='maximum depth of delta chain to compare')
+    packing.set_defaults(run=bench_pack)
+    checkout = commands.add_parser('checkout', help='time switch between '
+                                   'branches only different some files')
+    checkout.add_argument('--files', type=int, default=100000,
+                          help='number of files in synthetic tree')
+    checkout.add_argument('--size', type=int, default=1024,
+                          help='size of each file in bytes')
+    checkout.add_argument('--changes', type=int, default=10,
+                          help='number of files different between branches')
+    checkout.set_defaults(run=bench_checkout)
+    chunking = commands.add_parser('chunk', help='dedup ratio and '
+                                   'throughput of large file by chunks')
+    chunking.add_argument('--commits', type=int, default=5,
+                          help='number of versions of file')
+    chunking.add_argument('--size', type=int, default=32 * 1024 * 1024,
+                          help='size of file in bytes')
+    chunking.add_argument('--changes', type=int, default=4,
+                          help='number of changes between two versions')
+    chunking.set_defaults(run=bench_chunk)
+    objects = commands.add_parser('object', help='time and memory to '
+                                  'checkout one large object')
+    objects.add_argument('--size', type=int, default=1024 ** 3,
+                         help='size of object in bytes')
+    objects.add_argument('--forms', nargs='+',
+                         default=['compressed', 'packed', 'chunks'],
+                         choices=['compressed', 'packed', 'chunks'],
+                         help='forms of object to compare')
+    objects.set_defaults(run=bench_object)
+    pruning = commands.add_parser('prune', help='time and memory of gc '
+                                  'mark and sweep of loose objects')
+    pruning.add_argument('--objects', type=int, nargs='+',
+                         default=[10000, 100000],
+                         help='number of loose objects')
+    pruning.set_defaults(run=bench_prune)
+    merging = commands.add_parser('merge', help='time 3-way merge of files '
+                                  'with number of lines')
+    merging.add_argument('--lines', type=int, nargs='+',
+                         default=[10000, 100000],
+                         help='number of lines of file to compare')
+    merging.add_argument('--changes', type=int, default=20,
+                         help='number of changes at each branch')
+    merging.set_defaults(run=bench_merge)
+    repository = commands.add_parser('repository', help='time repeated '
+                                     'status by command line and API')
+    repository.add_argument('--files', type=int, default=10000,
+                            help='number of files in synthetic tree')
+    repository.add_argument('--size', type=int, default=1024,
+                            help='size of each file in bytes')
+    repository.add_argument('--runs', type=int, default=20,
+                            help='number of times run status')
+    repository.set_defaults(run=bench_repository)
+    startup = commands.add_parser('startup', help='import time of lgit '
+                                  'status with budget')
+    startup.add_argument('--files', type=int, default=100,
+                         help='number of files in repository')
+    startup.add_argument('--runs', type=int, default=10,
+                         help='number of times run status')
+    startup.add_argument('--budget', type=float, default=80,
+                         help='maximum import time in milliseconds')
+    startup.set_defaults(run=bench_startup)
+    args = parser.parse_args()
+    if not args.command:
+        parser.print_help()
+    else:
+        args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+#!/bin/bash
+# run in Deploy directory made by setup.sh
+# binary file changed in both branches isn't merged by lines
+# it is kept as it is in current branch and merge report it as conflict
+echo "-----------------INIT----------------"
+./git_bonus.py init
+echo "Welcome to Intek" > file1
+printf 'head\0\1\2\n' > data.bin
+printf 'Welcome\n' > latin
+./git_bonus.py add file1 data.bin latin
+./git_bonus.py commit -m "1st commit master"
+./git_bonus.py branch Intek
+echo "-----------------MASTER--------------"
+printf 'master\0\3\n' > data.bin
+printf 'caf\xe9\n' > latin
+./git_bonus.py add data.bin latin
+./git_bonus.py commit -m "2nd commit master"
+echo "-----------------INTEK---------------"
+./git_bonus.py checkout Intek
+printf 'intek\0\4\n' > data.bin
+printf 'th\xe9\n' > latin
+./git_bonus.py add data.bin latin
+./git_bonus.py commit -m "1st commit Intek"
+echo "-----------------MERGE---------------"
+./git_bonus.py checkout master
+./git_bonus.py merge Intek 2> error
+echo "-----------------CHECK---------------"
+if [ -s error ]; then
+    cat error
+    echo "FAIL: merge crashed"
+elif [ "$(printf 'master\0\3\n' | od -c)" != "$(od -c < data.bin)" ] ||
+     [ "$(printf 'caf\xe9\n' | od -c)" != "$(od -c < latin)" ]; then
+    echo "FAIL: binary files are changed"
+else
+    echo "PASS"
+fi
@@ -0,0 +1,34 @@
+#!/bin/bash
+# run in Deploy directory made by setup.sh
+# binary file changed after stash push isn't merged by lines
+# it is kept as it is now and stash pop report it as conflict
+echo "-----------------INIT----------------"
+./git_bonus.py init
+echo "Welcome to Intek" > file1
+printf 'head\0\1\2\n' > data.bin
+printf 'Welcome\n' > latin
+./git_bonus.py add file1 data.bin latin
+./git_bonus.py commit -m "1st commit master"
+echo "-----------------STASH---------------"
+echo "Shekcon is my nickname" > file1
+printf 'stash\0\3\n' > data.bin
+printf 'caf\xe9\n' > latin
+./git_bonus.py stash
+echo "-----------------MODIFIED------------"
+printf 'after\0\4\n' > data.bin
+printf 'th\xe9\n' > latin
+echo "-----------------STASH POP-----------"
+./git_bonus.py stash pop 2> error
+./git_bonus.py stash list
+echo "-----------------CHECK---------------"
+if [ -s error ]; then
+    cat error
+    echo "FAIL: stash pop crashed"
+elif [ "$(printf 'after\0\4\n' | od -c)" != "$(od -c < data.bin)" ] ||
+     [ "$(printf 'th\xe9\n' | od -c)" != "$(od -c < latin)" ]; then
+    echo "FAIL: binary files are changed"
+elif [ "$(cat file1)" != "Shekcon is my nickname" ]; then
+    echo "FAIL: text file isn't restored"
+else
+    echo "PASS"
+fi
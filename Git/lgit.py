@@ -1,18 +1,107 @@
 #!/usr/bin/env python3
 
 import os
+import re
+import json
 from datetime import datetime
-from argparse import ArgumentParser
-from time import time, mktime, strftime, localtime
+from argparse import ArgumentParser, ArgumentTypeError
+from time import time, time_ns, mktime, strftime, localtime
 from hashlib import sha1
+from concurrent.futures import ThreadPoolExecutor
+from struct import Struct
+from difflib import unified_diff
+from contextlib import contextmanager
+from sys import exit as exit_program
+try:
+    import fcntl
+except ImportError:
+    # system haven't flock then lgit processes aren't serialized
+    fcntl = None
+
+# stat cache of file in index: mtime_ns, ctime_ns, size, inode
+# all of zero mean unknown stat then file always need to be rehashed
+STAT_EMPTY = (0, 0, 0, 0)
+STAT_PATTERN = re.compile('[0-9a-f]{64} ')
+# binary index file: header, entries sorted by path, sha1 of all before
+# each entry: timestamp, hash current, hash add, hash commit,
+#             stat, length of path then path
+INDEX_MAGIC = b'LGIX'
+INDEX_VERSION = 1
+INDEX_HEADER = Struct('>4sII')
+INDEX_ENTRY = Struct('>14s20s20s20sQQQQH')
+NULL_HASH = bytes(20)
+# untracked cache: directory is key, value is its mtime_ns,
+# name of files and name of subdirectories
+UNTRACKED_CACHE = '.lgit/untracked'
+# file modified in this window before index written is racy
+# its mtime can be same with next change so don't trust its stat
+RACY_WINDOW_NS = 10 ** 9
+# size of buffer read file when hash or copy file
+BUFFER_SIZE = 1024 * 1024
+# number of threads hash files, None is depend on number of processors
+jobs = None
+# lock of repository is held by one lgit process at a time
+LOCK_FILE = '.lgit/lock'
+lock = None
+# files written in this command and not synced to disk yet
+written = set()
+# directories have files renamed in this command, synced at the end
+direcs_written = set()
+# files written by write_file_atomic in batch, renamed together at the
+# end of batch: file is key, its lock file is value, None if no batch
+renames = None
 
 
 def hash_sha1(file):
     '''
     Task: return hash sha1 of file passed
     '''
-    with open(file, 'rb') as f:
-        return sha1(f.read()).hexdigest()
+    hash_f = sha1()
+    for chunk in read_chunks(file):
+        hash_f.update(chunk)
+    return hash_f.hexdigest()
+
+
+def map_files(task, files):
+    '''
+    Task: run task on each file in pool of threads
+          return list result in same order with files
+    '''
+    if jobs == 1 or len(files) < 2:
+        return [task(file) for file in files]
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(task, files))
+
+
+def read_chunks(file):
+    '''
+    Task: yield content of file chunk by chunk in one reused buffer
+          so memory don't grow with size of file
+    '''
+    with open(file, 'rb', buffering=0) as f:
+        size_f = os.fstat(f.fileno()).st_size
+        buffer = bytearray(min(BUFFER_SIZE, size_f) or 1)
+        view = memoryview(buffer)
+        size = f.readinto(buffer)
+        while size:
+            yield view[:size]
+            size = f.readinto(buffer)
+
+
+def make_temp_file(direc, prefix):
+    '''
+    Task: create unique temporary file for writing like mkstemp
+          but with mode 666 less umask like files created by open
+          so objects of repository shared by group keep its permission
+    :return: file descriptor and path of file
+    '''
+    while True:
+        path = os.path.join(direc, prefix + os.urandom(8).hex())
+        try:
+            return os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY,
+                           0o666), path
+        except FileExistsError:
+            continue
 
 
 def split_dir_file(hash_file):
@@ -22,24 +111,110 @@ def split_dir_file(hash_file):
 def get_info_index(line):
     '''
     Task: return format timestamp, hash current, hash add, hash commit, path
+          of line in text index file
     '''
     line = line.strip()
-    return line[0:14], line[15:55], line[56:96], line[97:137], line[138:]
+    # old index format haven't stat cache before path
+    start_path = 203 if STAT_PATTERN.match(line, 138) else 138
+    return line[0:14], line[15:55], line[56:96], line[97:137].strip(), \
+        line[start_path:]
+
+
+def get_stat_index(line):
+    '''
+    Task: return stat cache of file in line of text index file
+    '''
+    if not STAT_PATTERN.match(line, 138):
+        return STAT_EMPTY
+    return tuple(int(line[i:i + 16], 16) for i in range(138, 202, 16))
+
+
+def read_index():
+    '''
+    Task: return dictionary with key is path of tracked file,
+          value is [timestamp, hash current, hash add, hash commit, stat]
+        + Text index file of old version is read then upgraded to
+          binary index file at next time write index
+    '''
+    with open('.lgit/index', 'rb') as f:
+        data = f.read()
+    if not data.startswith(INDEX_MAGIC):
+        return read_index_text(data.decode(errors='surrogateescape'))
+    body, checksum = data[:-20], data[-20:]
+    if sha1(body).digest() != checksum:
+        exit_program('fatal: index file corrupt')
+    _, version, count = INDEX_HEADER.unpack_from(body)
+    if version != INDEX_VERSION:
+        exit_program('fatal: index file unknown version %d' % (version))
+    index = {}
+    offset = INDEX_HEADER.size
+    for _ in range(count):
+        timestamp, current, add, commit, *stat, size_path = \
+            INDEX_ENTRY.unpack_from(body, offset)
+        offset = offset + INDEX_ENTRY.size
+        path = body[offset:offset + size_path].decode(
+            errors='surrogateescape')
+        offset = offset + size_path
+        index[path] = [timestamp.decode(), decode_hash(current),
+                       decode_hash(add), decode_hash(commit), tuple(stat)]
+    return index
+
+
+def read_index_text(data):
+    index = {}
+    for line in data.splitlines():
+        timestamp, current, add, commit, path = get_info_index(line)
+        index[path] = [timestamp, current, add, commit, get_stat_index(line)]
+    return index
+
+
+def write_index(index):
+    '''
+    Task: overwrite index file by binary format from dictionary passed
+    '''
+    data = [INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(index))]
+    for path in sorted(index):
+        timestamp, current, add, commit, stat = index[path]
+        path_b = path.encode(errors='surrogateescape')
+        data.append(INDEX_ENTRY.pack(
+            timestamp.encode(), encode_hash(current), encode_hash(add),
+            encode_hash(commit), *stat, len(path_b)))
+        data.append(path_b)
+    body = b''.join(data)
+    write_file_atomic([body, sha1(body).digest()], '.lgit/index', mode='wb')
+
 
+def encode_hash(hash_f):
+    return bytes.fromhex(hash_f) if hash_f else NULL_HASH
 
-def get_pos_track(files):
+
+def decode_hash(hash_b):
+    return '' if hash_b == NULL_HASH else hash_b.hex()
+
+
+def get_stat_file(file):
+    '''
+    Task: return mtime_ns, ctime_ns, size, inode of file
+    '''
+    info = os.stat(file)
+    return info.st_mtime_ns, info.st_ctime_ns, info.st_size, info.st_ino
+
+
+def is_stat_clean(stat_index, stat_file):
     '''
-    Task: return dictionary with key is file, value is location in index file
+    Task: return True if file is unchanged since stat cache in index file
     '''
-    locations = {}
-    for index, line in enumerate(read_file('.lgit/index')):
-        _, _, _, _, path = get_info_index(line)
-        if path in files:
-            locations[path] = index
-    return locations
+    return stat_index != STAT_EMPTY and stat_index == stat_file
+
+
+def is_racy(stat_file, time_write):
+    return stat_file[0] >= time_write - RACY_WINDOW_NS
 
 
 def read_file(file, mode='r'):
+    # file written in batch isn't renamed yet, read its lock file
+    if renames and file in renames:
+        file = renames[file]
     with open(file, mode) as f:
         return f.readlines()
 
@@ -55,34 +230,155 @@ def write_file(data, file, mode='w'):
         f.writelines(data)
 
 
-def get_tracked_files():
+def write_file_atomic(data, file, mode='w'):
+    '''
+    Task: replace file by new content, other lgit processes and crash
+          see old content or new content but never a part of it
+        + Write content into lock file next to file then rename it
+        + Lock file left by crashed process is overwritten because
+          only process hold lock of repository write lock files
+        + Lock file and files written before it (objects) are synced
+          to disk before rename, so after crash file never point to
+          data isn't on disk
+        + In batch_writes, rename is done at the end of batch
+    '''
+    file_lock = file + '.lock'
+    try:
+        write_file(data, file_lock, mode)
+        written.add(file_lock)
+        if renames is not None:
+            renames[file] = file_lock
+            return
+        flush_written()
+        os.replace(file_lock, file)
+    except BaseException:
+        written.discard(file_lock)
+        if os.path.exists(file_lock):
+            os.remove(file_lock)
+        raise
+    direcs_written.add(os.path.dirname(file) or '.')
+
+
+@contextmanager
+def batch_writes():
+    '''
+    Task: files written by write_file_atomic inside it are replaced
+          together at the end of it, so each file is synced one time
+        + Write all of lock files
+        + Sync each of them and files written before (objects) one time
+        + Rename all of lock files
+        + Their directories are synced one time at the end of command
+    '''
+    global renames
+    if renames is not None:
+        yield
+        return
+    renames = {}
+    try:
+        yield
+        flush_written()
+        for file, file_lock in renames.items():
+            os.replace(file_lock, file)
+            direcs_written.add(os.path.dirname(file) or '.')
+    finally:
+        for file_lock in renames.values():
+            written.discard(file_lock)
+            if os.path.exists(file_lock):
+                os.remove(file_lock)
+        renames = None
+
+
+def flush_written():
+    '''
+    Task: sync data of files written and not synced yet to disk
+        + Only these files are synced, each of them one time, in pool
+          of threads so file system write them together
+        + Their directories are synced at the end of command
+    '''
+    files = [file for file in written if os.path.exists(file)]
+    written.clear()
+    map_files(fsync_path, files)
+    direcs_written.update(os.path.dirname(file) or '.' for file in files)
+
+
+def sync_files():
+    '''
+    Task: sync files written in this command and their directories
+          to disk at the end of command
+    '''
+    flush_written()
+    map_files(fsync_path, [direc for direc in direcs_written
+                           if os.path.exists(direc)])
+    direcs_written.clear()
+
+
+def fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def lock_repo(shared=False):
+    '''
+    Task: wait until other lgit processes of repository finish
+          then hold lock of repository until this process exit
+    :param shared: command only read repository then it can run
+                   together with other commands only read
+    '''
+    global lock
+    if fcntl is None or lock is not None:
+        return
+    lock = open(LOCK_FILE, 'a')
+    fcntl.flock(lock.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+
+def get_tracked_files(index):
     '''
     Task: Return list tracked file in index file
     '''
-    paths = []
-    for line in read_file('.lgit/index'):
-        _, _, _, _, file = get_info_index(line)
-        paths.append(file)
-    return paths
+    return list(index)
 
 
-def create_object(files_add):
+def get_path_object(hash_f):
+    direc_obj, file_obj = split_dir_file(hash_f)
+    return os.path.join('.lgit/objects', direc_obj, file_obj)
+
+
+def create_object(path):
     '''
     Task:
         + Store a copy of the file content in the lgit database
+        + File is read only one time: hash and copy content of file
+          into temporary object then rename it into its hash
         + Each file will be stocked in the following way:
             - first two characters of the SHA1 will be the directory name
             - last 38 characters will be the file name
+        + Return hash sha1 of file
     '''
-    for path in files_add:
-        hash_f = hash_sha1(path)
-        direc_obj, file_obj = split_dir_file(hash_f)
-        direc_obj = os.path.join('.lgit/objects', direc_obj)
-        if not os.path.exists(direc_obj):
-            os.mkdir(direc_obj)
-        file_obj = os.path.join(direc_obj, file_obj)
-        if not os.path.exists(file_obj):
-            write_file(read_file(path, mode='rb'), file_obj, mode='wb')
+    hash_f = sha1()
+    fd, path_tmp = make_temp_file('.lgit/objects', 'tmp_obj_')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in read_chunks(path):
+                hash_f.update(chunk)
+                f.write(chunk)
+        hash_f = hash_f.hexdigest()
+        file_obj = get_path_object(hash_f)
+        direc_obj, _ = os.path.split(file_obj)
+        os.makedirs(direc_obj, exist_ok=True)
+        # same content stored before then don't need temporary object
+        if os.path.exists(file_obj):
+            os.remove(path_tmp)
+        else:
+            os.replace(path_tmp, file_obj)
+            written.add(file_obj)
+    except BaseException:
+        if os.path.exists(path_tmp):
+            os.remove(path_tmp)
+        raise
+    return hash_f
 
 
 def handle_raw_input(files):
@@ -117,8 +413,7 @@ def add_git(files_add):
     '''
     files_new = handle_raw_input(files_add)
     if files_new:
-        update_index(files_new, mode='add', location=get_pos_track(files_new))
-        create_object(files_new)
+        update_index(read_index(), files_new, mode='add')
     elif not files_add:
         print("Nothing specified, nothing added.\n\
 Maybe you wanted to say 'git add .'?")
@@ -127,39 +422,89 @@ Maybe you wanted to say 'git add .'?")
 def get_files_direc(direc='.'):
     '''
     Task: return list file in subdirectory passed and directory passed
+        + Directory have same mtime with last time scan then reuse its
+          files and subdirectories in untracked cache, only stat it
+        + Else list directory again and update untracked cache
     '''
+    # top of lgit directory can be passed as absolute path
+    # path of files are always relative with lgit directory
+    direc = os.path.relpath(direc)
+    cache = read_untracked_cache()
+    new_cache = {}
+    time_write = time_ns()
     dir_direc = [direc]
     file_direc = []
     # find all path of file in src
     while dir_direc:
         # take directory from src
+        sub_direc = dir_direc.pop()
         try:
-            entry_direc = os.scandir(dir_direc.pop())
-            for e in entry_direc:
-                # store file in data_dir
-                if e.is_file():
-                    path = os.path.abspath(e.path).replace(
-                        os.getcwd() + "/", '')
-                    file_direc.append(path)
-                # store directory in data_dir
-                if e.is_dir() and ".lgit" not in e.path:
-                    dir_direc.append(e.path)
+            mtime = os.stat(sub_direc).st_mtime_ns
+            if sub_direc in cache and cache[sub_direc][0] == mtime:
+                _, files, subdirs = cache[sub_direc]
+            else:
+                files, subdirs = scan_direc(sub_direc)
         except PermissionError:
-            pass
-
+            continue
+        # racy directory can change again in same mtime, don't cache it
+        if mtime < time_write - RACY_WINDOW_NS:
+            new_cache[sub_direc] = [mtime, files, subdirs]
+        else:
+            new_cache[sub_direc] = None
+        # path of file is relative with lgit directory
+        head = '' if sub_direc == '.' else sub_direc + '/'
+        file_direc.extend(head + file for file in files)
+        dir_direc.extend(head + sub for sub in subdirs)
+    update_untracked_cache(cache, new_cache, full=(direc == '.'))
     return file_direc
 
 
-def get_untracked(tracked_files):
+def scan_direc(direc):
+    '''
+    Task: return name of files and name of subdirectories of directory
+    '''
+    files = []
+    subdirs = []
+    with os.scandir(direc) as entry_direc:
+        for e in entry_direc:
+            if e.is_file():
+                files.append(e.name)
+            elif e.is_dir() and e.name != '.lgit':
+                subdirs.append(e.name)
+    return files, subdirs
+
+
+def read_untracked_cache():
+    try:
+        with open(UNTRACKED_CACHE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_untracked_cache(cache, new_cache, full):
+    '''
+    Task: write untracked cache if there is changes
+        + Scan from top of lgit directory then replace all of cache
+        + Else only update directories scanned
+    '''
+    data = {} if full else dict(cache)
+    data.update(new_cache)
+    # remove racy directories
+    data = {direc: info for direc, info in data.items() if info}
+    if data != cache:
+        write_file_atomic([json.dumps(data)], UNTRACKED_CACHE)
+
+
+def get_untracked(index):
     all_files = get_files_direc()
-    return [file for file in all_files if file not in tracked_files]
+    return [file for file in all_files if file not in index]
 
 
-def get_staged_unstaged():
+def get_staged_unstaged(index):
     staged_file = []
     unstaged_file = []
-    for line in read_file(file='.lgit/index'):
-        _, h_current, h_add, h_commit, name = get_info_index(line)
+    for name, (_, h_current, h_add, h_commit, _) in index.items():
         if h_current != h_add:
             unstaged_file.append(name)
         if h_add != h_commit:
@@ -168,14 +513,14 @@ def get_staged_unstaged():
 
 
 def status_git():
-    tracked_files = get_tracked_files()
-    update_index(tracked_files, mode='status')
-    show_status(tracked_files)
+    index = read_index()
+    update_index(index, get_tracked_files(index), mode='status')
+    show_status(index)
 
 
-def show_status(tracked_files):
-    untracked = get_untracked(tracked_files)
-    staged, unstaged = get_staged_unstaged()
+def show_status(index):
+    untracked = get_untracked(index)
+    staged, unstaged = get_staged_unstaged(index)
     print('On branch master\n')
     if not os.listdir('.lgit/commits'):
         print("No commits yet\n")
@@ -211,76 +556,87 @@ def commit_git(message):
         + Create name file is time commit in snapshots directory
         + Nothing added to commit then show status
     '''
-    tracked_files = get_tracked_files()
-    staged_file, _ = get_staged_unstaged()
+    index = read_index()
+    staged_file, _ = get_staged_unstaged(index)
     if staged_file:
-        update_index(tracked_files, mode='commit')
-        time_ns = format_time(time(), second=False)
-        create_commit(message, time_ns)
-        create_snapshot(os.path.join('.lgit/snapshots', time_ns))
+        # index, commit and snapshot are replaced together
+        with batch_writes():
+            update_index(index, get_tracked_files(index), mode='commit')
+            time_ns = format_time(time(), second=False)
+            create_commit(message, time_ns)
+            create_snapshot(index, os.path.join('.lgit/snapshots',
+                                                time_ns))
     else:
-        show_status(tracked_files)
+        show_status(index)
 
 
 def create_commit(message, time_ns):
     # save commit message and author
     author = read_file(file='.lgit/config')[0]
     time_commit = time_ns.split('.')[0]
-    write_file(["%s%s\n\n%s\n" % (author, time_commit, message)],
-               os.path.join('.lgit/commits', time_ns))
+    write_file_atomic(["%s%s\n\n%s\n" % (author, time_commit, message)],
+                      os.path.join('.lgit/commits', time_ns))
 
 
-def create_snapshot(path):
+def create_snapshot(index, path):
     # save all of hash commit and path in index file
     # into timestamp of commit file at snapshot directory
     data_snap = []
-    for line in read_file('.lgit/index'):
-        _, _, _, h_commit, name = get_info_index(line)
-        data_snap.append(h_commit + " " + name + '\n')
-    write_file(data_snap, file=path)
+    for name in sorted(index):
+        _, _, _, h_commit, _ = index[name]
+        data_snap.append('%40s %s\n' % (h_commit, name))
+    write_file_atomic(data_snap, file=path)
 
 
-def update_index(files, mode, location=''):
+def update_index(index, files, mode):
     '''
     Task: Update information of tracked file or untracked file in index file
         + With add command:
             - Update hash add and timestamp of file
-            - Or add new line infomation file added in index file
+            - Or add new infomation of file added in index file
         + With status command:
             - Update hash current and timestamp of file in index file
         + With commit command:
             - Update hash commit of file in index file
     '''
-    data_index = read_file('.lgit/index')
-    for i, file in enumerate(files):
-        h_current = hash_sha1(file)
+    time_write = time_ns()
+    entries = []
+    for file in files:
+        # take stat before hash so change while hashing is seen next time
+        stat_f = get_stat_file(file)
+        # hash add equal last time add of file
+        # commit maybe nothing or have before
+        _, h_current, h_add, h_commit, stat_index = index.get(
+            file, ['', '', '', '', STAT_EMPTY])
+        # commit equal hash add if commit else still be same in last time
+        if mode == 'commit':
+            h_commit = h_add
+        # file unchanged since last time then reuse hash current in index
+        # else file need to be read to hash it again
+        # add command store object in same time with hash file
+        if not is_stat_clean(stat_index, stat_f) or (
+                mode == 'add' and
+                not os.path.exists(get_path_object(h_current))):
+            h_current = ''
+        entries.append([file, stat_f, h_current, h_add, h_commit])
+
+    # hash all of files need to be read in pool of threads
+    unhashed = [entry for entry in entries if not entry[2]]
+    task = create_object if mode == 'add' else hash_sha1
+    for entry, h_current in zip(unhashed, map_files(
+            task, [entry[0] for entry in unhashed])):
+        entry[2] = h_current
+
+    for file, stat_f, h_current, h_add, h_commit in entries:
+        # hash add equal hash of file right now
         if mode == 'add':
-            # get index from mapping index of file
-            # hash add equal hash of file right now
-            # commit maybe nothing or have before
-            line = location.get(file, -1)
             h_add = h_current
-            if line != -1:
-                _, _, _, h_commit, _ = get_info_index(data_index[line])
-            else:
-                h_commit = ''
-        else:
-            # index equal enunumerate coz run all name file in index file
-            # hash add equal last time add of file
-            # commit equal hash add if commit else still be same in last time
-            line = i
-            _, _, h_add, h_commit, _ = get_info_index(data_index[line])
-            if mode == 'commit':
-                h_commit = h_add
-        # add new one in index file if first time tracking file
-        # else override on location of file in index file
-        if line != -1:
-            data_index[line] = format_index(format_time(
-                os.path.getmtime(file)), h_current, h_add, h_commit, file)
-        else:
-            data_index.append(format_index(format_time(
-                os.path.getmtime(file)), h_current, h_add, h_commit, file))
-    write_file(data_index, file='.lgit/index')
+        timestamp = format_time(stat_f[0] / 10 ** 9)
+        # racy file can change again in same mtime, don't cache its stat
+        if is_racy(stat_f, time_write):
+            stat_f = STAT_EMPTY
+        index[file] = [timestamp, h_current, h_add, h_commit, stat_f]
+    write_index(index)
 
 
 def format_date_log(timestamp):
@@ -310,7 +666,7 @@ def get_info_commit(commit):
 
 
 def ls_files_git():
-    files = get_trackfile_cwd(get_tracked_files())
+    files = get_trackfile_cwd(get_tracked_files(read_index()))
     if files:
         print("\n".join(sorted(files, key=str)))
 
@@ -327,23 +683,116 @@ def get_trackfile_cwd(tracked_files):
 def rm_git(files):
     files_new = handle_raw_input(files)
     if files_new:
-        data_index = read_file(file='.lgit/index')
-        location = get_pos_track(files_new)
+        index = read_index()
         for file in files_new:
-            line = location.get(file, -1)  # get location of file
             # if not in index file print error
-            if line != -1:
+            if file in index:
                 if os.path.exists(file):
                     os.remove(file)
                     remove_empty_dirs(file)
-                data_index[line] = ""
+                del index[file]
             else:
                 print("fatal: pathspec '" + file + "' did not match any files")
-        write_file(data_index, file='.lgit/index')
+        write_index(index)
     elif not files:
         print('missing argument of file to removed')
 
 
+def diff_git(cached, commits):
+    '''
+    Task: Show changes between working directory, index and commits
+        + No commit: working directory with index
+        + --cached: index with commit, default is last commit
+        + One commit: working directory with commit
+        + Two commits: first commit with second commit
+        + Path have same hash at 2 sides is skipped without reading it
+        + Diff is printed file by file
+    '''
+    for commit in commits:
+        if not os.path.exists(os.path.join('.lgit/snapshots', commit)):
+            print("fatal: bad revision '%s'" % (commit))
+            return
+    if len(commits) > 2:
+        print('usage: ./lgit.py diff [--cached] [<commit> [<commit>]]')
+        return
+    if len(commits) == 2:
+        files_new = get_files_snapshot(commits[1])
+        files_diff = {file: (hash_f, False) for file, hash_f
+                      in files_new.items()}
+        show_diff(get_files_snapshot(commits[0]), files_diff)
+        return
+    index = read_index()
+    if not cached:
+        update_index(index, [file for file in get_tracked_files(index)
+                             if os.path.exists(file)], mode='status')
+    if commits:
+        files_old = get_files_snapshot(commits[0])
+    elif cached:
+        snapshots = sorted(os.listdir('.lgit/snapshots'), key=str)
+        files_old = get_files_snapshot(snapshots[-1]) if snapshots else {}
+    else:
+        files_old = {file: index[file][2] for file in index}
+    files_diff = {}
+    for file, (_, h_current, h_add, _, _) in index.items():
+        if cached:
+            files_diff[file] = (h_add, False)
+        elif os.path.exists(file):
+            files_diff[file] = (h_current, True)
+    show_diff(files_old, files_diff)
+
+
+def get_files_snapshot(commit):
+    '''
+    Task: return dictionary path is key, hash is value of snapshot
+    '''
+    files_hash = {}
+    for line in read_file(os.path.join('.lgit/snapshots', commit)):
+        hash_f, file = line[:40].strip(), line[41:].rstrip('\n')
+        if hash_f:
+            files_hash[file] = hash_f
+    return files_hash
+
+
+def show_diff(files_old, files_new):
+    '''
+    Task: print unified diff of each file have different hash
+    :param files_old: a dictionary key is file, value is old hash
+    :param files_new: a dictionary key is file, value is new hash and
+                      new content is read from working directory or not
+    '''
+    for file in sorted(set(files_old) | set(files_new)):
+        hash_old = files_old.get(file, '')
+        hash_new, is_working = files_new.get(file, ('', False))
+        if hash_old == hash_new:
+            continue
+        content_old = read_object(hash_old)
+        if is_working:
+            with open(file, 'rb') as f:
+                content_new = f.read()
+        else:
+            content_new = read_object(hash_new)
+        name_old = 'a/' + file if hash_old else '/dev/null'
+        name_new = 'b/' + file if hash_new else '/dev/null'
+        print('diff --lgit a/%s b/%s' % (file, file))
+        if b'\0' in content_old or b'\0' in content_new:
+            print('Binary files %s and %s differ' % (name_old, name_new))
+            continue
+        for line in unified_diff(
+                content_old.decode(errors='replace').splitlines(True),
+                content_new.decode(errors='replace').splitlines(True),
+                name_old, name_new):
+            if not line.endswith('\n'):
+                line = line + '\n\\ No newline at end of file\n'
+            print(line, end='')
+
+
+def read_object(hash_f):
+    if not hash_f:
+        return b''
+    with open(get_path_object(hash_f), 'rb') as f:
+        return f.read()
+
+
 def remove_empty_dirs(path):
     head, _ = os.path.split(path)
     # remove directory if it empty directory
@@ -381,7 +830,7 @@ def init_git():
 
 
 def config_author(name):
-    write_file(['%s\n' % (name)], file='.lgit/config')
+    write_file_atomic(['%s\n' % (name)], file='.lgit/config')
 
 
 def find_parent_git():
@@ -408,9 +857,18 @@ def format_time(timestamp, second=True):
     return timestamp.strftime('%Y%m%d%H%M%S.%f')
 
 
-# get string format index
-def format_index(timestamp, current, add, commit, path):
-    return '%s %s %s %40s %s\n' % (timestamp, current, add, commit, path)
+def get_jobs(value):
+    '''
+    Task: return number of threads from value of option jobs
+          it must be at least 1
+    '''
+    try:
+        jobs = int(value)
+    except ValueError:
+        raise ArgumentTypeError("invalid int value: '%s'" % (value))
+    if jobs < 1:
+        raise ArgumentTypeError('number of jobs must be at least 1')
+    return jobs
 
 
 def get_args():
@@ -421,15 +879,22 @@ def get_args():
     parser.add_argument('-m', '--message',
                         help="description about what you do")
     parser.add_argument('--author', help="set author for commit",)
+    parser.add_argument('-j', '--jobs', type=get_jobs,
+                        help="number of threads hash files")
+    parser.add_argument('--cached', action='store_true',
+                        help="show changes staged for the next commit")
     return parser.parse_args()
 
 
 def main():
+    global jobs
     args = get_args()
+    jobs = args.jobs
     try:
         if args.command == 'init':
             init_git()
         elif find_parent_git():
+            lock_repo(shared=args.command in ('log', 'ls-files'))
             if args.command == 'add':
                 add_git(args.files)
             elif args.command == 'status':
@@ -444,6 +909,8 @@ def main():
                 log_git()
             elif args.command == 'rm':
                 rm_git(args.files)
+            elif args.command == 'diff':
+                diff_git(args.cached, args.files)
             else:
                 print("Git: '" + args.command + "' is not a git command.")
         else:
@@ -453,6 +920,8 @@ of the parent directories)')
         print('fatal: not a git repository (or any of the parent directories)')
     except IsADirectoryError:
         pass
+    finally:
+        sync_files()
 
 
 if __name__ == '__main__':
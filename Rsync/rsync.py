@@ -1,9 +1,49 @@
 #!/usr/bin/env python3
 # set interpreter
 
+import errno
 import hashlib
+import json
+import mmap
 import os
-from argparse import ArgumentParser
+import stat
+import tempfile
+import zlib
+from argparse import ArgumentParser, ArgumentTypeError
+from concurrent.futures import ThreadPoolExecutor
+from time import time_ns
+
+# weak checksum of block is Adler-32, it can be rolled one byte at a time
+MOD_ADLER = 65521
+# size of block is square root of size of destination between them
+MIN_BLOCK = 700
+MAX_BLOCK = 128 * 1024
+# size of buffer copy file when kernel can't copy it
+BUFFER_SIZE = 1024 * 1024
+# no block of destination is found in this number of blocks of source
+# then window jumps over source instead of rolling one byte at a time,
+# length of jump is doubled after each miss
+LITERAL_BLOCKS = 8
+# type of instructions of delta
+COPY = 0
+LITERAL = 1
+# error of kernel copy when file system or system doesn't support it
+UNSUPPORTED = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+               errno.EBADF)
+# digest of option checksum, blake2b is faster than md5 on 64 bits system
+DIGESTS = {'blake2b': hashlib.blake2b, 'md5': hashlib.md5}
+# checksum cache of each tree: path relative with top of tree is key,
+# value is size, mtime_ns, inode, ctime_ns and digest of file
+CACHE_DIREC = os.path.join(os.environ.get('XDG_CACHE_HOME') or
+                           os.path.expanduser('~/.cache'), 'rsync.py')
+# file changed in this window before it is hashed is racy
+# its next change can have same ctime so its digest isn't cached
+RACY_WINDOW_NS = 10 ** 9
+# top of tree is key, value is its checksum cache
+caches = {}
+changed_caches = set()
+# top of tree is key, value is files of tree are checked in this run
+used_keys = {}
 
 
 def handle_wel_args():
@@ -18,28 +58,67 @@ def handle_wel_args():
     rsync.add_argument('-c', '--checksum',
                        help="check sum no check time & size",
                        action="store_true")
+    rsync.add_argument('--checksum-choice', '--cc', choices=DIGESTS,
+                       default='blake2b',
+                       help="digest of option checksum")
     rsync.add_argument('-r', '--recursive',
                        help="resure into directory",
                        action="store_true")
+    rsync.add_argument('-j', '--jobs', type=get_jobs, default=1,
+                       metavar='N',
+                       help="number of files are synced at same time")
     rsync = rsync.parse_args()
     path = os.getcwd()
 
 
-def get_per_size_src(src):
-    size_src = os.stat(src).st_size
-    per = os.stat(src).st_mode
-    return per, size_src
+def get_jobs(value):
+    """
+    parameter: value of option jobs
+    return number of jobs, it must be at least 1
+    """
+    jobs = int(value)
+    if jobs < 1:
+        raise ArgumentTypeError("number of jobs must be at least 1")
+    return jobs
+
+
+def get_info_src(src):
+    """
+    parameter: path of source
+    return stat of source (stat of file it points to if it is symlink)
+    and is source symlink
+    """
+    info = os.lstat(src)
+    if stat.S_ISLNK(info.st_mode):
+        return os.stat(src), True
+    return info, False
+
 
+def get_info_des(des):
+    """
+    parameter: path of destination
+    return stat of destination, None if it doesn't exist
+    """
+    try:
+        return os.stat(des)
+    except OSError:
+        return None
 
-def get_atime_mtime_src(src):
-    atime = os.stat(src).st_atime
-    mtime = os.stat(src).st_mtime
-    return atime, mtime
+
+def is_same_per_mtime(info_des, info_src):
+    """
+    parameter: stat of destination, None if it is changed, and source
+    return True if destination have permission and modification time
+    of source, they aren't set again so ctime of destination is kept
+    """
+    return (info_des is not None and
+            info_des.st_mode == info_src.st_mode and
+            info_des.st_mtime_ns == info_src.st_mtime_ns)
 
 
-def change_per_atime_mtime(file, per, atime, mtime):
-    os.chmod(file, per)
-    os.utime(file, (atime, mtime))
+def change_per_atime_mtime(file, info_src):
+    os.chmod(file, info_src.st_mode)
+    os.utime(file, ns=(info_src.st_atime_ns, info_src.st_mtime_ns))
 
 
 def handle_path(directory, mode=1):
@@ -63,21 +142,140 @@ def handle_path(directory, mode=1):
                 os.mkdir(path)
 
 
-def check_sum(dest, src, size_src):
+def check_sum(dest, src, info_des, info_src):
+    """
+    parameter: path and stat of destination and source
+    return True if destination and source have same digest
+    files have different size are different without hash them
+    """
+    if info_des.st_size != info_src.st_size:
+        return False
     try:
-        des = os.open(dest, os.O_RDONLY)
+        digest_des = get_digest(dest, info_des)
     except PermissionError:
         os.unlink(dest)
         rewrite_content_des(dest, src)
-    else:
-        size_des = os.stat(dest).st_size
-        md5_des = hashlib.md5(os.read(des, size_des)).hexdigest()
-        src = os.open(src, os.O_RDONLY)
-        md5_src = hashlib.md5(os.read(src, size_src)).hexdigest()
-        os.close(des)
-        os.close(src)
-        return md5_src == md5_des
-    return True
+        return True
+    return get_digest(src, info_src) == digest_des
+
+
+def hash_file(file):
+    """
+    parameter: path of file
+    return digest of file, file is read by one reused buffer
+    so memory don't grow with size of file
+    """
+    digest = DIGESTS[rsync.checksum_choice]()
+    buffer = bytearray(BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(file, 'rb', buffering=0) as f:
+        size = f.readinto(buffer)
+        while size:
+            digest.update(view[:size])
+            size = f.readinto(buffer)
+    return digest.hexdigest()
+
+
+def get_digest(file, info):
+    """
+    parameter: path and stat of file
+    return digest of file from checksum cache if size, mtime, inode
+    and ctime of file aren't changed, else hash file and update cache
+    ctime can't be set by utime so file rewritten then given its old
+    mtime back is hashed again
+    """
+    root, key = find_cache(file)
+    cache = caches.get(root, {})
+    stat_f = [info.st_size, info.st_mtime_ns, info.st_ino, info.st_ctime_ns]
+    if root:
+        used_keys[root].add(key)
+    entry = cache.get(key)
+    if entry and entry[:4] == stat_f:
+        return entry[4]
+    time_hash = time_ns()
+    digest = hash_file(file)
+    if root and info.st_ctime_ns < time_hash - RACY_WINDOW_NS:
+        cache[key] = stat_f + [digest]
+        changed_caches.add(root)
+    return digest
+
+
+def get_path_cache(root):
+    """
+    parameter: top of tree
+    return path of checksum cache of tree, each digest have its cache
+    """
+    name = hashlib.md5(root.encode()).hexdigest()
+    return os.path.join(CACHE_DIREC, '%s.%s.json' % (
+        name, rsync.checksum_choice))
+
+
+def open_cache(root):
+    """
+    parameter: source or destination in arguments
+    load checksum cache of tree, top of tree is directory of file
+    """
+    root = os.path.abspath(root)
+    if not os.path.isdir(root):
+        root = os.path.dirname(root)
+    if root in caches:
+        return
+    try:
+        with open(get_path_cache(root)) as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        entries = {}
+    caches[root] = entries
+    used_keys[root] = set()
+
+
+def find_cache(file):
+    """
+    parameter: path of file
+    return top of deepest tree have file and path of file relative
+    with it, None if file isn't in any tree
+    """
+    file = os.path.abspath(file)
+    for root in sorted(caches, key=len, reverse=True):
+        head = os.path.join(root, '')
+        if file.startswith(head):
+            return root, file[len(head):]
+    return None, file
+
+
+def remove_missing_entries():
+    """
+    remove entries of files don't exist anymore from checksum caches
+    so caches don't grow forever, files are hashed in this run exist
+    then only other entries are checked
+    """
+    for root, cache in caches.items():
+        missing = [key for key in cache if key not in used_keys[root] and
+                   not os.path.lexists(os.path.join(root, key))]
+        for key in missing:
+            del cache[key]
+        if missing:
+            changed_caches.add(root)
+
+
+def save_caches():
+    """
+    write checksum cache of trees are changed into temp file
+    then rename it so cache is never a part of old and new cache
+    """
+    remove_missing_entries()
+    for root in changed_caches:
+        temp = None
+        try:
+            os.makedirs(CACHE_DIREC, exist_ok=True)
+            fd, temp = tempfile.mkstemp(dir=CACHE_DIREC)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(caches[root], f)
+            os.replace(temp, get_path_cache(root))
+        except OSError:
+            # cache is only used to be fast, sync is still done
+            if temp and os.path.exists(temp):
+                os.remove(temp)
 
 
 def get_valid_name(des, name_src):
@@ -85,106 +283,291 @@ def get_valid_name(des, name_src):
     parameter: file or directory
     if dir:
         join dir + name of source
-    return path
+    return path and its stat, None if it doesn't exist
     """
-    if os.path.isdir(des) or des[-1] == "/":
+    info_des = get_info_des(des)
+    if (info_des and stat.S_ISDIR(info_des.st_mode)) or des[-1] == "/":
         des = os.path.join(des, name_src)
-    return des
-
-
-def is_diff_mtime_size(des, mtime, size_src):
-    mtime_des = os.stat(des).st_mtime
-    size_des = os.stat(des).st_size
-    return mtime != mtime_des or size_des != size_src
+        info_des = get_info_des(des)
+    return des, info_des
 
 
-def is_des_newer_src(des, mtime):
-    mtime_des = os.stat(des).st_mtime
-    return mtime < mtime_des
+def is_diff_mtime_size(info_des, info_src):
+    return (info_src.st_mtime_ns != info_des.st_mtime_ns or
+            info_src.st_size != info_des.st_size)
 
 
-def is_more_size_src(des, size_src):
-    size_des = os.stat(des).st_size
-    return size_des > size_src
+def is_des_newer_src(info_des, info_src):
+    return info_src.st_mtime_ns < info_des.st_mtime_ns
 
 
 def rewrite_content_des(file, src):
     """
     parameter: path_file
     write all content of source into destination
-    return True if error
     """
     # open file
     src = os.open(src, os.O_RDONLY)
-    # if des not exist, will create new one
-    des = os.open(file, os.O_CREAT | os.O_RDWR)
-    # read file
-    result = os.read(src, 100)
-    while result != b"":
-        os.write(des, result)
-        result = os.read(src, 100)
-    os.close(src)
-    os.close(des)
+    try:
+        # if des not exist, will create new one
+        des = os.open(file, os.O_CREAT | os.O_WRONLY | os.O_TRUNC)
+        try:
+            copy_range(src, des, 0, os.fstat(src).st_size)
+        finally:
+            os.close(des)
+    finally:
+        os.close(src)
+
+
+def copy_file_range(src, des, offset, count):
+    return os.copy_file_range(src, des, count, offset)
 
 
-def write_diff_des(des, pos, content):
+def sendfile(src, des, offset, count):
+    return os.sendfile(des, src, offset, count)
+
+
+# copy_file_range is only in new linux
+KERNEL_COPIES = [sendfile]
+if hasattr(os, 'copy_file_range'):
+    KERNEL_COPIES.insert(0, copy_file_range)
+
+
+def copy_range(src, des, offset, count):
+    """
+    parameter: + src: file descriptor read
+               + des: file descriptor write at its current location
+               + offset: location read in src
+               + count: number of bytes copy
+    copy by kernel so data isn't read into memory of process:
+        + try copy_file_range then sendfile
+        + read and write by large buffer when system doesn't support them
+    """
+    end = offset + count
+    for copy in KERNEL_COPIES:
+        try:
+            while offset < end:
+                sent = copy(src, des, offset, end - offset)
+                if not sent:
+                    break
+                offset = offset + sent
+        except OSError as error:
+            # file system or kernel can't copy these files
+            if error.errno not in UNSUPPORTED:
+                raise
+        if offset >= end:
+            return
+    buffer = bytearray(min(BUFFER_SIZE, end - offset))
+    view = memoryview(buffer)
+    os.lseek(src, offset, os.SEEK_SET)
+    while offset < end:
+        size = os.readv(src, [view[:end - offset]])
+        if not size:
+            break
+        write_all(des, view[:size])
+        offset = offset + size
+
+
+def get_block_size(size_des):
+    """
+    parameter: size of destination
+    return size of block like rsync: square root of size of destination
+    between minimum and maximum size of block
+    """
+    return max(MIN_BLOCK, min(MAX_BLOCK, int(size_des ** 0.5) & ~7))
+
+
+def get_signatures(des, block):
+    """
+    parameter: + des: file descriptor of destination
+               + block: size of block
+    read destination block by block
+    return dictionary: weak checksum of block is key,
+           value is dictionary: strong checksum is key, offset is value
+    """
+    signatures = {}
+    offset = 0
+    data = os.read(des, block)
+    while data:
+        strong = hashlib.md5(data).digest()
+        signatures.setdefault(zlib.adler32(data), {}).setdefault(strong,
+                                                                 offset)
+        offset = offset + len(data)
+        data = os.read(des, block)
+    return signatures
+
+
+def find_block(signatures, data):
+    """
+    parameter: + signatures: block signatures of destination
+               + data: block of source
+    return offset of same block in destination, None if not found
+    """
+    strongs = signatures.get(zlib.adler32(data))
+    if strongs:
+        return strongs.get(hashlib.md5(data).digest())
+    return None
+
+
+def find_delta(data, signatures, block, size_des):
+    """
+    parameter: + data: content of source
+               + signatures: block signatures of destination
+               + block: size of block
+               + size_des: size of destination
+    yield instructions build source from destination:
+        + (COPY, offset, length): copy block of destination at offset
+        + (LITERAL, start, length): write bytes of source at start
+    window of block roll over source one byte at a time, its weak
+    checksum is updated from byte go out and byte come in
+    rolling is slow (about 1 MB/s), when no block is found in
+    LITERAL_BLOCKS blocks the window jumps over source then rolls again
+    over one block, so block of destination at any offset after a long
+    change is still found, jumps are doubled so rolled bytes of source
+    changed all are only about block * log2(size / block)
+    """
+    size = len(data)
+    start = pos = 0
+    weak = None
+    # window rolls one byte at a time until this position
+    roll_end = LITERAL_BLOCKS * block
+    skip = block
+    while pos + block <= size:
+        if weak is None:
+            weak = zlib.adler32(data[pos:pos + block])
+            low, high = weak & 0xffff, weak >> 16
+        strongs = signatures.get(weak)
+        if strongs:
+            offset = strongs.get(hashlib.md5(data[pos:pos + block]).digest())
+            if offset is not None:
+                if start < pos:
+                    yield LITERAL, start, pos - start
+                yield COPY, offset, block
+                pos = start = pos + block
+                weak = None
+                roll_end = pos + LITERAL_BLOCKS * block
+                skip = block
+                continue
+        if pos + block == size:
+            break
+        # source is changed too much here, jump over bytes sent as
+        # literal then roll over one block to find block at any offset
+        if pos >= roll_end:
+            pos = min(pos + skip, size - block)
+            roll_end = pos + block
+            skip = skip * 2
+            weak = None
+            continue
+        # roll window: remove first byte and add next byte
+        out, new = data[pos], data[pos + block]
+        low = (low - out + new) % MOD_ADLER
+        high = (high - block * out + low - 1) % MOD_ADLER
+        weak = high << 16 | low
+        pos = pos + 1
+    # last block of destination is shorter, it can only be end of source
+    tail = size_des % block
+    if tail and size - tail >= start:
+        offset = find_block(signatures, data[size - tail:])
+        if offset == size_des - tail:
+            if start < size - tail:
+                yield LITERAL, start, size - tail - start
+            yield COPY, offset, tail
+            return
+    if start < size:
+        yield LITERAL, start, size - start
+
+
+def merge_delta(delta):
+    """
+    parameter: instructions of delta
+    return list of instructions, instructions of same type are next
+    to each other are merged into one instruction
+    """
+    merged = []
+    for kind, start, length in delta:
+        if merged and merged[-1][0] == kind and \
+                sum(merged[-1][1:]) == start:
+            merged[-1][2] = merged[-1][2] + length
+        else:
+            merged.append([kind, start, length])
+    return merged
+
+
+def write_all(fd, data):
+    """
+    parameter: + fd: file descriptor
+               + data: bytes or memoryview
+    write all of data, os.write can write only a part of it
+    """
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def apply_delta(dest, des, src, delta):
     """
-    parameter: + des: file descriptor
-               + pos: location write
-               + content: data write
+    parameter: + dest: path of destination
+               + des: file descriptor of destination
+               + src: file descriptor of source
+               + delta: instructions build source from destination
+    write new content into temp file next to destination then rename it
+    so destination is never a part of old content and new content
     """
-    os.lseek(des, pos, 0)
-    os.write(des, str.encode(content))
+    direc, name = os.path.split(dest)
+    fd, temp = tempfile.mkstemp(dir=direc or '.', prefix='.' + name + '.')
+    try:
+        with os.fdopen(fd, 'wb', buffering=0) as f:
+            for kind, start, length in delta:
+                # literal bytes are copied from source by kernel too
+                copy_range(des if kind == COPY else src, f.fileno(), start,
+                           length)
+        os.replace(temp, dest)
+    except BaseException:
+        os.unlink(temp)
+        raise
 
 
 def update_diff_des(dest, src, size_src):
     """
-    find different if size destination < source else rewrite des
-    send different to destination
-    append data missing from source
+    rsync algorithm:
+        + split destination into blocks, weak and strong checksum
+          of each block are its signature
+        + roll window over source to find blocks of destination
+        + copy blocks are found from destination, write other bytes
+          (literal) from source
+    if they are already identical, nothing is written
     """
-    # handle size destination biggest than source
-    # pass --> rewrite destination
-    if is_more_size_src(dest, size_src):
+    # handle destination dont have permission read
+    try:
+        des = os.open(dest, os.O_RDONLY)
+    except PermissionError:
         os.unlink(dest)
         rewrite_content_des(dest, src)
-    else:
-        # handle define
-        miss_text = ""
-        size_des = os.stat(dest).st_size
-        # handle destination dont have permission readly or write
-        try:
-            des = os.open(dest, os.O_RDWR)
-        except PermissionError:
-            os.unlink(dest)
-            rewrite_content_des(dest, src)
-        else:
-            src = os.open(src, os.O_RDONLY)
-            # handle get data
-            data_des = os.read(des, size_des).decode()
-            data_src = os.read(src, size_src).decode()
-            os.close(src)
-            # handle find diff destination from source
-            diff = {i: data_src[i] for i in range(
-                len(data_des)) if data_des[i] != data_src[i]}
-            # override write destination at posistion different
-            for key in diff.keys():
-                write_diff_des(des, key, diff[key])
-            # find text missing of destination
-            if len(data_src) > len(data_des):
-                miss_text = data_src[len(data_des):]
-            os.close(des)
-            # write miss text at the end destination
-            des = os.open(dest, os.O_RDWR | os.O_APPEND)
-            if miss_text:
-                os.write(des, str.encode(miss_text))
-            os.close(des)
+        return
+    src = os.open(src, os.O_RDONLY)
+    try:
+        size_des = os.fstat(des).st_size
+        block = get_block_size(size_des)
+        signatures = get_signatures(des, block)
+        # map source into memory so it is read only once by system
+        data = b""
+        if size_src:
+            data = mmap.mmap(src, 0, access=mmap.ACCESS_READ)
+        delta = merge_delta(find_delta(data, signatures, block, size_des))
+        if size_src:
+            data.close()
+        # delta of same file is only copy of whole destination
+        if delta != ([[COPY, 0, size_des]] if size_des else []):
+            apply_delta(dest, des, src, delta)
+    finally:
+        os.close(src)
+        os.close(des)
 
 
-def is_diff_des(des, src, mtime, size_src):
+def is_diff_des(des, src, info_des, info_src):
     # handle option checksum
     if rsync.checksum:
-        return not check_sum(des, src, size_src)
+        return not check_sum(des, src, info_des, info_src)
     # handle option check newer and check different
     # run option check newer:
     #       + pass --> skip check modified time & size
@@ -193,16 +576,16 @@ def is_diff_des(des, src, mtime, size_src):
     #       + is different modified time ?
     #       + is different size ?
     # if diff: return True
-    return (not (rsync.update and is_des_newer_src(des, mtime))
-            and is_diff_mtime_size(des, mtime, size_src))
+    return (not (rsync.update and is_des_newer_src(info_des, info_src))
+            and is_diff_mtime_size(info_des, info_src))
 
 
-def handle_sym_hard(des, src):
+def handle_sym_hard(des, src, info_des, info_src):
     # create link need file not exits
-    if os.path.exists(des):
+    if info_des:
         os.unlink(des)
     try:
-        if os.stat(src).st_nlink > 1:
+        if info_src.st_nlink > 1:
             # create hardlink
             os.link(src, des)
         else:
@@ -215,29 +598,61 @@ def handle_sym_hard(des, src):
 
 
 def main(des, src):
+    """
+    sync source into destination, source and destination are only
+    stat once and their stat is reused
+    return message of error, "" if there is no error
+    """
     # source is destination then skip rsync
-    if des != src:
-        try:
-            # get information source
-            per, size_src = get_per_size_src(src)
-            atime, mtime = get_atime_mtime_src(src)
-            # get name of source
-            name_src = os.path.split(src)[1]
-            des = get_valid_name(des, name_src)
-            # handle source have symlink or hardlink
-            if (os.path.islink(src) or os.stat(src).st_nlink > 1):
-                handle_sym_hard(des, src)
-            # handle file not exist
-            elif not os.path.exists(des):
-                rewrite_content_des(des, src)
-            # handle file exist and different on destination
-            elif is_diff_des(des, src, mtime, size_src):
-                update_diff_des(des, src, size_src)
-            # handle change permission, access time and modification time
-            if os.path.exists(des):
-                change_per_atime_mtime(des, per, atime, mtime)
-        except PermissionError:
-            print("rsync: send_files failed to open \"" + os.path.join(path, src) + "\": Permission denied (13)")
+    if des == src:
+        return ""
+    try:
+        # get information source
+        info_src, is_link = get_info_src(src)
+        # get name of source
+        name_src = os.path.split(src)[1]
+        des, info_des = get_valid_name(des, name_src)
+        # handle source have symlink or hardlink
+        if is_link or info_src.st_nlink > 1:
+            handle_sym_hard(des, src, info_des, info_src)
+            info_des = None
+        # handle file not exist
+        elif info_des is None:
+            rewrite_content_des(des, src)
+        # handle file exist and different on destination
+        elif is_diff_des(des, src, info_des, info_src):
+            update_diff_des(des, src, info_src.st_size)
+            info_des = None
+        # handle change permission, access time and modification time
+        # of destination is changed or different from source
+        if not is_same_per_mtime(info_des, info_src):
+            try:
+                change_per_atime_mtime(des, info_src)
+            except FileNotFoundError:
+                pass
+    except PermissionError:
+        return ("rsync: send_files failed to open \"" +
+                os.path.join(path, src) + "\": Permission denied (13)")
+    return ""
+
+
+def sync_files(files):
+    """
+    parameter: list of destination and source of each file
+    sync files in pool of threads when option jobs is more than 1
+    messages are printed in same order with files
+    """
+    if rsync.jobs == 1 or len(files) < 2:
+        print_messages(main(des, src) for des, src in files)
+        return
+    with ThreadPoolExecutor(max_workers=rsync.jobs) as pool:
+        print_messages(pool.map(main, *zip(*files)))
+
+
+def print_messages(messages):
+    for message in messages:
+        if message:
+            print(message)
 
 
 def get_files_dirs_src(src):
@@ -268,6 +683,7 @@ def handle_recursive(dest, src):
             direc = direc[direc.index("/") + 1:]
         handle_path(os.path.join(dest, direc), mode=0)
     # rsync all files in source
+    files = []
     for file in files_src:
         # if the end of src is "/" then only copy content of directory
         if src[-1] == '/':
@@ -275,8 +691,9 @@ def handle_recursive(dest, src):
             des_new = os.path.join(dest, content_src)
         else:
             des_new = os.path.join(dest, file)
-        # rsync destination
-        main(des_new, file)
+        files.append((des_new, file))
+    # rsync destination
+    sync_files(files)
 
 
 if __name__ == "__main__":
@@ -297,6 +714,9 @@ if __name__ == "__main__":
     if (len(rsync.srcs) > 1 or rsync.recursive) and os.path.isfile(dest):
         print("ERROR: destination must be a directory when copying more than 1 file")
     else:
+        if rsync.checksum:
+            for root in rsync.srcs + [dest]:
+                open_cache(root)
         for src in rsync.srcs:
             if not rsync.recursive and os.path.isdir(src):
                 print("skipping directory .")
@@ -305,4 +725,5 @@ if __name__ == "__main__":
             elif rsync.recursive and os.path.isdir(src):
                 handle_recursive(dest, src)
             else:
-                main(dest, src)
+                print_messages([main(dest, src)])
+        save_caches()